@@ -1,19 +1,47 @@
-from flask import Flask, render_template, request, redirect, url_for, session
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify
 import os
 from dotenv import load_dotenv
 import random
 
-from image_fetcher import get_brave_image, get_pexels_image, get_unsplash_image, get_pixabay_image
-from translation import translate
-from database import (
-    save_to_supabase, update_scoreboard, get_scoreboard, upload_to_s3,
-    get_unused_word, mark_word_as_used
-)
+import hashlib
+
+from database import update_scoreboard, get_scoreboard, mark_word_as_used, word_pool
+from prefetch import work_queue, build_work_item, get_session_id, NoCandidates
+from jobs import job_queue
+from reservations import reservations
+import http_client
+import instrumentation
+from image_fetcher import provider_status
 
 load_dotenv()
 
 app = Flask(__name__)
-app.secret_key = os.urandom(24) 
+# Every gunicorn worker must sign sessions with the same key
+# A random per-process key only works with a single worker, see gunicorn.conf.py
+app.secret_key = os.getenv('FLASK_SECRET_KEY') or os.urandom(24)
+instrumentation.init_app(app)
+
+@app.before_request
+def start_background_workers():
+    # Picks up jobs left pending by a previous run
+    job_queue.start()
+
+def warm_up():
+    """
+    Start the background workers and build the slow clients before the
+    first request needs them. gunicorn.conf.py runs this in a thread once
+    a worker is accepting requests.
+    """
+    from translation import get_client
+    from storage import get_s3_client
+    
+    job_queue.start()
+    work_queue.start()
+    for build in (get_client, get_s3_client):
+        try:
+            build()
+        except Exception as e:
+            print(f"Warm-up of {build.__name__} failed, it will be retried on first use: {e}")
 
 @app.route('/username', methods=['GET', 'POST'])
 def set_username():
@@ -30,32 +58,62 @@ def home():
     if 'username' not in session:
         return redirect(url_for('set_username'))
     
-    word = get_unused_word()
-    if not word:
-        return "No unused words available.", 404
-    print(word)
+    # Pop a prefetched work item; build one inline only when the queue is dry
+    session_id = get_session_id(session)
+    item = work_queue.acquire(session_id)
+    prefetched = item is not None
+    if item is None:
+        try:
+            item = build_work_item()
+        except NoCandidates:
+            return "No images available right now, please try again shortly.", 503
+        if not item:
+            return "No unused words available.", 404
+        work_queue.lease(session_id, item)
+    instrumentation.log('work_item', word=item['word'], prefetched=prefetched,
+                        candidates=len(item['image_urls']))
 
-    word = word.title()
-    image_providers = [get_unsplash_image, get_pexels_image, get_pixabay_image, get_brave_image] 
-    
-    image_url = None
-    for provider_func in image_providers:
-        image_url = provider_func(word)
-        if image_url: 
-            break
-
-    translation = translate(word).title()
+    image_url = item['image_urls'][0] if item['image_urls'] else None
     
     # Get scoreboard data
     scoreboard = get_scoreboard()
     
     return render_template('index.html', 
-                          word=word, 
+                          word=item['word'], 
                           image_url=image_url,
-                          translation=translation, 
+                          image_urls=item['image_urls'],
+                          translation=item['translation'], 
                           username=session['username'],
                           scoreboard=scoreboard)
 
+def enqueue_accept(image_url, word, translation):
+    """
+    Queue the S3 upload, Supabase insert, mark-as-used and scoreboard
+    update for an accepted image, and free the reviewer's lease.
+    """
+    session_id = get_session_id(session)
+    # The job releases the word reservation once the word is marked as
+    # used, so nobody can claim it in between
+    item = work_queue.release(session_id, release_reservation=False)
+    reservation = None
+    if item and item.get('reservation'):
+        if item['word'].lower() == word.lower():
+            reservation = item['reservation']
+        else:
+            # A custom word was accepted instead; the drawn word stays unused
+            reservations.release(item['word'], item['reservation'])
+    # A double-submitted form maps to the same job
+    idempotency_key = hashlib.sha256(f"{session_id}|{word.lower()}|{image_url}".encode()).hexdigest()
+    job_queue.enqueue('accept_image', {
+        'image_url': image_url,
+        'word': word,
+        'translation': translation,
+        'username': session['username'],
+        'reservation': reservation,
+    }, idempotency_key=idempotency_key)
+    # Keep the word out of the pool until the job marks it as used
+    word_pool.discard(word)
+
 @app.route('/upload', methods=['POST'])
 def upload():
     if 'username' not in session:
@@ -65,12 +123,7 @@ def upload():
     word = request.form['word']
     translation = request.form['translation']
 
-    s3_key = upload_to_s3(image_url, translation)
-    save_to_supabase(s3_key, word, translation)
-    mark_word_as_used(word)
-    
-    # Update scoreboard - user accepted an image
-    update_scoreboard(session['username'], 'accepted')
+    enqueue_accept(image_url, word, translation)
 
     return redirect(url_for('home'))
 
@@ -93,12 +146,7 @@ def upload_custom():
     else:
         translation = request.form['translation']
 
-    s3_key = upload_to_s3(image_url, translation)
-    save_to_supabase(s3_key, original_word, translation)
-    mark_word_as_used(original_word)
-    
-    # Update scoreboard - user accepted an image
-    update_scoreboard(session['username'], 'accepted')
+    enqueue_accept(image_url, original_word, translation)
 
     return redirect(url_for('home'))
 
@@ -113,7 +161,39 @@ def reject():
     word = request.form['word']
     mark_word_as_used(word)
     # end of update 
+    # Marked as used first, so the released word cannot be claimed again
+    work_queue.release(get_session_id(session))
     return redirect(url_for('home'))
 
+@app.route('/metrics/prefetch')
+def prefetch_metrics():
+    return jsonify(work_queue.metrics())
+
+@app.route('/metrics/http')
+def http_metrics():
+    return jsonify(http_client.latency_stats())
+
+@app.route('/metrics/providers')
+def provider_metrics():
+    return jsonify(provider_status())
+
+@app.route('/jobs')
+def jobs_status():
+    if session.get('username', '').lower() != 'cenan':
+        return redirect(url_for('home'))
+    state = request.args.get('state', 'failed')
+    return jsonify({
+        'counts': job_queue.counts(),
+        'jobs': job_queue.list_jobs(state=state)
+    })
+
+@app.route('/jobs/<int:job_id>/replay', methods=['POST'])
+def replay_job(job_id):
+    if session.get('username', '').lower() != 'cenan':
+        return redirect(url_for('home'))
+    if job_queue.replay(job_id):
+        return jsonify({'replayed': job_id})
+    return jsonify({'error': f"No failed job {job_id}"}), 404
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5001)
\ No newline at end of file
@@ -0,0 +1,340 @@
+"""
+End-to-end benchmark of both apps against the local stand-ins in
+benchmarks/standins.py (PostgREST, S3, image providers, Google Translate).
+
+The generator app and the reviewer app are served in this process, like
+one threaded gunicorn worker each. Scripted users then run a scenario:
+
+    generator   N users on /, accepting (/upload) or rejecting (/reject)
+    reviewer    N reviewers scrolling /api/records and posting /decisions
+
+Reports throughput and p50/p95/p99 per endpoint, the Server-Timing
+breakdown per endpoint, and time in each span over the whole run
+(including background jobs and prefetching). --save writes the results as
+JSON, and --compare prints the change against a saved run.
+
+    python benchmarks/e2e_bench.py --scenario generator --users 20 --duration 30 --save before.json
+    python benchmarks/e2e_bench.py --scenario generator --users 20 --duration 30 --compare before.json
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from html import unescape
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+
+PROVIDER_HOSTS = {
+    'api.unsplash.com': 'unsplash',
+    'api.pexels.com': 'pexels',
+    'pixabay.com': 'pixabay',
+    'api.search.brave.com': 'brave',
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def configure_environment(base_url, workdir):
+    """Point every setting at the stand-ins and a scratch directory; must run before the app imports."""
+    os.environ.update({
+        'SUPABASE_PROJECT_URL': base_url,
+        'SUPABASE_ANON_PUBLIC_KEY': 'bench',
+        'AWS_ACCESS_KEY': 'bench',
+        'AWS_SECRET_ACCESS_KEY': 'bench',
+        'S3_ENDPOINT_URL': base_url,
+        'UNSPLASH_API_KEY': 'bench',
+        'PEXELS_API_KEY': 'bench',
+        'PIXABAY_API_KEY': 'bench',
+        'BRAVE_API_KEY': 'bench',
+        'FLASK_SECRET_KEY': 'bench',
+        'LOG_SAMPLE_RATE': '0',
+    })
+    for name in ('JOB_QUEUE_PATH', 'LEADERBOARD_CACHE_PATH',
+                 'PROVIDER_CACHE_PATH', 'IMAGE_HASH_INDEX_PATH', 'CACHE_PATH'):
+        os.environ[name] = os.path.join(workdir, name.lower() + '.sqlite3')
+
+
+class RedirectAdapter(HTTPAdapter):
+    """Sends requests for a real provider host to its stand-in instead."""
+
+    def __init__(self, target):
+        super().__init__()
+        self.target = target
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        request.url = f"{self.target}{parts.path}" + (f"?{parts.query}" if parts.query else '')
+        return super().send(request, **kwargs)
+
+
+class StandinTranslateClient:
+    """translate_v2.Client lookalike that calls the stand-in over HTTP."""
+
+    def __init__(self, base_url):
+        self.url = f"{base_url}/translate"
+
+    def translate(self, values, source_language=None, target_language=None):
+        import http_client
+        single = isinstance(values, str)
+        response = http_client.post(self.url, json={'q': [values] if single else list(values),
+                                                    'source': source_language, 'target': target_language})
+        response.raise_for_status()
+        results = [{'translatedText': t['translatedText'], 'input': text}
+                   for t, text in zip(response.json()['data']['translations'], [values] if single else values)]
+        return results[0] if single else results
+
+
+def wire_standins(base_url):
+    import http_client
+    import translation
+    from provider_cache import QuotaLimiter, limiters
+
+    for host, provider in PROVIDER_HOSTS.items():
+        http_client.get_session(host).mount('https://', RedirectAdapter(f"{base_url}/providers/{provider}"))
+    translation._client = StandinTranslateClient(base_url)
+    # Quotas belong to the real providers
+    for provider in list(limiters):
+        limiters[provider] = QuotaLimiter(10 ** 9, 1)
+
+    from storage import get_s3_client, S3_BUCKET
+    get_s3_client().create_bucket(Bucket=S3_BUCKET)
+
+
+def seed_review_rows(count):
+    from database import supabase_request
+    rows = [{'s3_key': f'Seed{i}-{i:06d}.jpeg', 'eng_word': f'seed{i}', 'tr_word': f'Seed{i}'}
+            for i in range(count)]
+    for i in range(0, count, 500):
+        supabase_request('POST', 'speech-therapy-s3-keys', data=rows[i:i + 500])
+
+
+def serve(app):
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', free_port(), app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+class Recorder:
+    """Latencies, errors and Server-Timing spans per endpoint."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.spans = {}
+
+    def record(self, endpoint, started, response=None, ok=True):
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+                return
+            self.latencies.setdefault(endpoint, []).append(elapsed)
+            timing = response.headers.get('Server-Timing', '') if response is not None else ''
+            spans = self.spans.setdefault(endpoint, {})
+            for entry in filter(None, (part.strip() for part in timing.split(','))):
+                match = re.match(r'([^;]+);dur=([\d.]+)', entry)
+                if match and match.group(1) != 'total':
+                    spans[match.group(1)] = spans.get(match.group(1), 0.0) + float(match.group(2))
+
+    def call(self, endpoint, func, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = func(*args, timeout=60, allow_redirects=False, **kwargs)
+        except requests.RequestException:
+            self.record(endpoint, started, ok=False)
+            return None
+        self.record(endpoint, started, response, ok=response.status_code < 400)
+        return response
+
+
+def generator_user(base, recorder, deadline, accept_rate):
+    session = requests.Session()
+    session.post(f"{base}/username", data={'username': f'bench{threading.get_ident() % 1000}'})
+    fields = re.compile(r'name="(word|image_url|translation)" value="([^"]*)"')
+    while time.monotonic() < deadline:
+        response = recorder.call('GET /', session.get, f"{base}/")
+        if response is None or response.status_code != 200:
+            time.sleep(0.5)
+            continue
+        form = {name: unescape(value) for name, value in fields.findall(response.text)}
+        if random.random() < accept_rate and form.get('image_url'):
+            recorder.call('POST /upload', session.post, f"{base}/upload", data=form)
+        else:
+            recorder.call('POST /reject', session.post, f"{base}/reject", data={'word': form.get('word', '')})
+
+
+def reviewer_user(base, recorder, deadline, confirm_rate):
+    session = requests.Session()
+    recorder.call('GET /reviewer', session.get, f"{base}/")
+    after = None
+    while time.monotonic() < deadline:
+        url = f"{base}/api/records" + (f"?after={after}" if after is not None else '')
+        response = recorder.call('GET /api/records', session.get, url)
+        if response is None or response.status_code != 200:
+            time.sleep(0.5)
+            continue
+        page = response.json()
+        decisions = {'confirm': [], 'deny': []}
+        for record in page['records']:
+            decisions['confirm' if random.random() < confirm_rate else 'deny'].append(record['s3_key'])
+        recorder.call('POST /decisions', session.post, f"{base}/decisions", json=decisions)
+        after = page['next_after']
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)] if values else 0.0
+
+
+def summarize(recorder, elapsed, span_before, span_after):
+    endpoints = {}
+    for endpoint in sorted(set(recorder.latencies) | set(recorder.errors)):
+        values = recorder.latencies.get(endpoint, [])
+        endpoints[endpoint] = {
+            'requests': len(values),
+            'errors': recorder.errors.get(endpoint, 0),
+            'rps': len(values) / elapsed,
+            'p50': percentile(values, 0.50) * 1000,
+            'p95': percentile(values, 0.95) * 1000,
+            'p99': percentile(values, 0.99) * 1000,
+            'stages': {name: total / len(values) for name, total in
+                       sorted(recorder.spans.get(endpoint, {}).items())} if values else {},
+        }
+    spans = {}
+    for labels, series in span_after.items():
+        before = span_before.get(labels, {'count': 0, 'sum': 0.0})
+        count = series['count'] - before['count']
+        if count:
+            spans[labels[0]] = {'count': count, 'mean_ms': (series['sum'] - before['sum']) / count * 1000}
+    return {'elapsed': elapsed, 'endpoints': endpoints, 'spans': spans}
+
+
+def print_report(results, baseline=None):
+    print(f"\n{'endpoint':<18}{'requests':>9}{'errors':>8}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for endpoint, r in results['endpoints'].items():
+        print(f"{endpoint:<18}{r['requests']:>9}{r['errors']:>8}{r['rps']:>8.1f}"
+              f"{r['p50']:>9.0f}{r['p95']:>9.0f}{r['p99']:>9.0f}")
+
+    print(f"\n{'endpoint':<18}stage breakdown (mean ms per request, from Server-Timing)")
+    for endpoint, r in results['endpoints'].items():
+        stages = ', '.join(f"{name} {ms:.0f}" for name, ms in r['stages'].items()) or '-'
+        print(f"{endpoint:<18}{stages}")
+
+    print(f"\n{'span':<36}{'calls':>8}{'mean ms':>9}   (all threads, incl. background work)")
+    for name, s in sorted(results['spans'].items()):
+        print(f"{name:<36}{s['count']:>8}{s['mean_ms']:>9.1f}")
+
+    if baseline:
+        print(f"\n{'vs baseline':<18}{'req/s':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+        for endpoint, r in results['endpoints'].items():
+            old = baseline['endpoints'].get(endpoint)
+            if not old:
+                continue
+            change = lambda key: f"{(r[key] - old[key]) / old[key] * 100:+.0f}%" if old[key] else 'n/a'
+            print(f"{endpoint:<18}{change('rps'):>10}{change('p50'):>10}{change('p95'):>10}{change('p99'):>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', default='generator,reviewer', help='comma-separated scenarios')
+    parser.add_argument('--users', type=int, default=10, help='concurrent users per scenario')
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--latency', default='', help='stand-in ms per service, e.g. supabase=40,provider=150')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of stand-in calls failing with 503')
+    parser.add_argument('--accept-rate', type=float, default=0.7)
+    parser.add_argument('--review-rows', type=int, default=5000)
+    parser.add_argument('--save', help='write results to this JSON file')
+    parser.add_argument('--compare', help='JSON file of an earlier run to diff against')
+    args = parser.parse_args()
+    scenarios = [name.strip() for name in args.scenario.split(',')]
+
+    port = free_port()
+    standins = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, 'standins.py'), '--port', str(port),
+                                 '--latency', args.latency, '--error-rate', str(args.error_rate)])
+    base_url = f"http://127.0.0.1:{port}"
+    workdir = tempfile.mkdtemp(prefix='e2e-bench-')
+    try:
+        wait_for(f"{base_url}/rest/v1/scoreboard")
+        configure_environment(base_url, workdir)
+
+        import app as generator_app
+        import pair_reviewer
+        from instrumentation import span_seconds
+        wire_standins(base_url)
+        if 'reviewer' in scenarios:
+            seed_review_rows(args.review_rows)
+
+        servers = []
+        users = []
+        recorder = Recorder()
+        span_before = span_seconds.snapshot()
+        deadline = time.monotonic() + args.duration
+        if 'generator' in scenarios:
+            server, base = serve(generator_app.app)
+            servers.append(server)
+            users += [threading.Thread(target=generator_user, args=(base, recorder, deadline, args.accept_rate))
+                      for _ in range(args.users)]
+        if 'reviewer' in scenarios:
+            server, base = serve(pair_reviewer.app)
+            servers.append(server)
+            users += [threading.Thread(target=reviewer_user, args=(base, recorder, deadline, 0.8))
+                      for _ in range(args.users)]
+
+        print(f"running {', '.join(scenarios)} with {args.users} users each for {args.duration:.0f}s")
+        started = time.monotonic()
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+        elapsed = time.monotonic() - started
+
+        results = summarize(recorder, elapsed, span_before, span_seconds.snapshot())
+        results['settings'] = vars(args)
+        baseline = None
+        if args.compare:
+            with open(args.compare) as f:
+                baseline = json.load(f)
+        print_report(results, baseline)
+        if args.save:
+            with open(args.save, 'w') as f:
+                json.dump(results, f, indent=2)
+        for server in servers:
+            server.shutdown()
+    finally:
+        standins.terminate()
+        standins.wait()
+
+
+if __name__ == '__main__':
+    main()
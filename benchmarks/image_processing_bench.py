@@ -0,0 +1,91 @@
+"""
+Image processing benchmark: the old full-resolution decode + thumbnail
+versus image_processing.process_image (draft-mode JPEG decoding).
+
+A synthetic camera-sized JPEG is generated once. Each method runs in a
+fresh child process so its peak RSS is measured on its own (Linux only).
+
+    python benchmarks/image_processing_bench.py --width 6000 --height 4000 --runs 5
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from PIL import Image
+
+
+def make_jpeg(width, height):
+    # Gradients plus noise compress like a photo rather than a flat fill
+    img = Image.linear_gradient('L').resize((width, height))
+    noise = Image.effect_noise((width, height), 16)
+    img = Image.merge('RGB', (img, noise, img.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    buffer = BytesIO()
+    img.save(buffer, format='JPEG', quality=92)
+    return buffer.getvalue()
+
+
+def legacy_process(img_data):
+    img = Image.open(BytesIO(img_data))
+    img.thumbnail((800, 800))
+    buffer = BytesIO()
+    img.save(buffer, format="JPEG", quality=85, optimize=True)
+    return buffer.getvalue()
+
+
+def streaming_process(img_data):
+    from image_processing import process_image
+    return process_image(img_data)
+
+
+METHODS = {'legacy': legacy_process, 'draft': streaming_process}
+
+
+def peak_rss_mb():
+    # VmHWM is reset on exec, unlike ru_maxrss which the child would
+    # inherit from this (large) parent process
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def child(method, img_data, runs, queue):
+    baseline = peak_rss_mb()
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        METHODS[method](img_data)
+        timings.append(time.perf_counter() - started)
+    peak = peak_rss_mb()
+    queue.put((min(timings), sum(timings) / len(timings), peak, peak - baseline))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--width', type=int, default=6000)
+    parser.add_argument('--height', type=int, default=4000)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    img_data = make_jpeg(args.width, args.height)
+    print(f"source: {args.width}x{args.height} JPEG, {len(img_data) / 1e6:.1f} MB")
+    print(f"{'method':<8}{'best ms':>10}{'mean ms':>10}{'peak RSS MB':>13}{'growth MB':>11}")
+
+    ctx = multiprocessing.get_context('spawn')
+    for method in METHODS:
+        queue = ctx.Queue()
+        proc = ctx.Process(target=child, args=(method, img_data, args.runs, queue))
+        proc.start()
+        best, mean, peak, growth = queue.get()
+        proc.join()
+        print(f"{method:<8}{best * 1000:>10.1f}{mean * 1000:>10.1f}{peak:>13.1f}{growth:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+Load test: requests/sec and latency percentiles for a running app, or a
+comparison of gunicorn worker classes on a stand-in app.
+
+Against a running server (the generator needs a username in the session):
+
+    python benchmarks/load_test.py --url http://localhost:8000/ --username load --concurrency 50
+
+Without --url, a stand-in WSGI app whose every request only sleeps --io-ms
+is served by gunicorn once per worker class, with the worker counts from
+gunicorn.conf.py. That isolates how many blocking waits each worker class
+overlaps; it is not a measurement of either app, which also does CPU work
+and contends on shared clients. Use --url (or benchmarks/e2e_bench.py)
+for those:
+
+    python benchmarks/load_test.py --concurrency 50 --duration 10
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def standin_app(environ, start_response):
+    time.sleep(float(environ.get('QUERY_STRING', '').partition('=')[2] or 0.2))
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [b'ok']
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def run_load(url, concurrency, duration, username=None):
+    """
+    Hit url from `concurrency` clients for `duration` seconds.
+
+    Returns:
+        dict: requests, errors, rps, p50, p95, p99 (seconds)
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client():
+        session = requests.Session()
+        if username:
+            session.post(url.rstrip('/') + '/username', data={'username': username}, allow_redirects=False)
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                ok = session.get(url, timeout=60, allow_redirects=False).status_code < 400
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': len(latencies) / elapsed,
+        'p50': percentile(latencies, 0.50),
+        'p95': percentile(latencies, 0.95),
+        'p99': percentile(latencies, 0.99),
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def serve_standin(worker_class, port):
+    # The stand-in has no sessions; the key only satisfies gunicorn.conf.py
+    env = dict(os.environ, GUNICORN_WORKER_CLASS=worker_class, PORT=str(port),
+               FLASK_SECRET_KEY=os.getenv('FLASK_SECRET_KEY', 'load-test'))
+    if worker_class == 'sync':
+        # gunicorn silently upgrades sync to gthread when threads > 1
+        env['GUNICORN_THREADS'] = '1'
+    return subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(BENCH_DIR, '..', 'gunicorn.conf.py'),
+         '--chdir', BENCH_DIR, 'load_test:standin_app'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def print_row(label, result):
+    print(f"{label:<10}{result['requests']:>9}{result['errors']:>8}{result['rps']:>9.1f}"
+          f"{result['p50'] * 1000:>9.0f}{result['p95'] * 1000:>9.0f}{result['p99'] * 1000:>9.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='running server to test; omit to compare worker classes')
+    parser.add_argument('--username', help='set this username in the session first')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=10, help='seconds per run')
+    parser.add_argument('--io-ms', type=int, default=200, help='stand-in wait per request')
+    args = parser.parse_args()
+
+    print(f"{'target':<10}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    if args.url:
+        print_row('url', run_load(args.url, args.concurrency, args.duration, args.username))
+        return
+
+    print(f"stand-in app: every request sleeps {args.io_ms} ms; not the generator or reviewer")
+    for worker_class in ('sync', 'gthread'):
+        port = free_port()
+        server = serve_standin(worker_class, port)
+        try:
+            url = f"http://127.0.0.1:{port}/?io={args.io_ms / 1000}"
+            wait_for(url)
+            print_row(worker_class, run_load(url, args.concurrency, args.duration))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
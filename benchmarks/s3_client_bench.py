@@ -0,0 +1,74 @@
+"""
+S3 client benchmark: building a boto3 client on every call (the old
+upload_to_s3 / get_image_url behaviour) versus the shared client from
+storage.get_s3_client.
+
+Each iteration generates one presigned URL, which is computed locally, so
+the numbers isolate client setup cost and need no AWS access.
+
+    python benchmarks/s3_client_bench.py --calls 50
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+# Dummy credentials so botocore can sign without a real account
+os.environ.setdefault('AWS_ACCESS_KEY', 'bench')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+
+import boto3
+
+import storage
+
+
+def presign(client):
+    return client.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': storage.S3_BUCKET, 'Key': 'bench.jpeg'},
+        ExpiresIn=3600
+    )
+
+
+def per_call_client():
+    client = boto3.client(
+        's3',
+        region_name=storage.AWS_REGION,
+        aws_access_key_id=storage.AWS_ACCESS_KEY,
+        aws_secret_access_key=storage.AWS_SECRET_ACCESS_KEY
+    )
+    return presign(client)
+
+
+def pooled_client():
+    return presign(storage.get_s3_client())
+
+
+def measure(func, calls):
+    timings = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {
+        'mean_ms': 1000 * sum(timings) / len(timings),
+        'p50_ms': 1000 * timings[len(timings) // 2],
+        'p95_ms': 1000 * timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'path':<18}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, func in (('per-call client', per_call_client), ('pooled client', pooled_client)):
+        r = measure(func, args.calls)
+        print(f"{name:<18}{r['mean_ms']:>10.2f}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
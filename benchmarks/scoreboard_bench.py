@@ -0,0 +1,136 @@
+"""
+Scoreboard update benchmark: lost-update rate and latency of the legacy
+read-modify-write path versus the atomic increment_score RPC and the
+write-behind buffer.
+
+Supabase is replaced by an in-memory table where each statement is atomic
+(as in Postgres) and every round trip sleeps for --rtt milliseconds.
+
+    python benchmarks/scoreboard_bench.py --threads 8 --clicks 50 --rtt 40
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+# Keep the benchmark from touching the real leaderboard cache file
+os.environ.setdefault('LEADERBOARD_CACHE_PATH', ':memory:')
+
+import database
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self._payload = payload
+        self.headers = {}
+
+    def json(self):
+        return self._payload
+
+
+class FakeScoreboard:
+    """Just enough PostgREST for the scoreboard table and its RPCs."""
+
+    def __init__(self, rtt):
+        self.rtt = rtt
+        self.rows = {}
+        self.lock = threading.Lock()
+        self.round_trips = 0
+
+    def _add(self, username, accepted, rejected):
+        row = self.rows.setdefault(username, {'username': username, 'accepted': 0, 'rejected': 0})
+        row['accepted'] += accepted
+        row['rejected'] += rejected
+
+    def request(self, method, table, data=None, query_params=None, extra_headers=None):
+        time.sleep(self.rtt)
+        with self.lock:
+            self.round_trips += 1
+            if table == 'rpc/increment_score':
+                self._add(data['p_username'], data['p_accepted'], data['p_rejected'])
+                return FakeResponse(204)
+            if table == 'rpc/increment_scores':
+                for row in data['p_rows']:
+                    self._add(row['username'], row['accepted'], row['rejected'])
+                return FakeResponse(204)
+            username = query_params.split('username=eq.')[1].split('&')[0] if query_params else None
+            if method == 'GET':
+                row = self.rows.get(username)
+                return FakeResponse(200, [dict(row)] if row else [])
+            if method == 'PATCH':
+                self.rows[username].update(data)
+                return FakeResponse(204)
+            if method == 'POST':
+                self.rows[data['username']] = dict(data)
+                return FakeResponse(201)
+        raise ValueError(f"Unhandled {method} {table}")
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run(mode, threads, clicks, rtt):
+    fake = FakeScoreboard(rtt)
+    database.supabase_request = fake.request
+    if mode == 'legacy':
+        update = database._update_scoreboard_read_modify_write
+    elif mode == 'rpc':
+        update = database.update_scoreboard
+    else:
+        buffer = database.ScoreboardBuffer(interval=3600)
+        update = buffer.add
+
+    # Every thread clicks as the same user, like one reviewer with many tabs
+    latencies = []
+    latencies_lock = threading.Lock()
+
+    def click(_):
+        started = time.perf_counter()
+        update('bench-user', 'accepted')
+        elapsed = time.perf_counter() - started
+        with latencies_lock:
+            latencies.append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(click, range(threads * clicks)))
+    if mode == 'write-behind':
+        buffer.flush()
+    wall = time.perf_counter() - started
+
+    expected = threads * clicks
+    stored = fake.rows.get('bench-user', {}).get('accepted', 0)
+    return {
+        'mode': mode,
+        'expected': expected,
+        'stored': stored,
+        'lost_pct': 100.0 * (expected - stored) / expected,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'round_trips': fake.round_trips,
+        'wall_s': wall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--clicks', type=int, default=25, help='clicks per thread')
+    parser.add_argument('--rtt', type=float, default=40, help='simulated round trip in ms')
+    args = parser.parse_args()
+
+    print(f"{'mode':<13}{'expected':>9}{'stored':>8}{'lost %':>8}{'p50 ms':>9}{'p95 ms':>9}{'trips':>7}{'wall s':>8}")
+    for mode in ('legacy', 'rpc', 'write-behind'):
+        r = run(mode, args.threads, args.clicks, args.rtt / 1000)
+        print(f"{r['mode']:<13}{r['expected']:>9}{r['stored']:>8}{r['lost_pct']:>8.1f}"
+              f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['round_trips']:>7}{r['wall_s']:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,391 @@
+"""
+Local stand-ins for every service the apps call, in one HTTP server:
+
+    /rest/v1/<table>, /rest/v1/rpc/<fn>   PostgREST subset over in-memory tables
+    /providers/<name>/...                 Unsplash, Pexels, Pixabay and Brave search
+    /images/<n>.jpeg                      corpus of generated sample photos
+    /translate                            Google Translate v2 style endpoint
+    /<bucket>/<key>                       S3 PUT/GET/HEAD/DELETE, path-style
+
+Every response waits for the service's configured latency, and a
+configurable fraction fails with 503.
+
+    python benchmarks/standins.py --port 9000 --latency supabase=40,provider=150 --error-rate 0.01
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from PIL import Image, ImageDraw
+
+# Simulated round-trip time per service, in milliseconds
+DEFAULT_LATENCY = {'supabase': 40, 'provider': 150, 'image': 60, 'translate': 80, 's3': 30}
+
+SAMPLE_WORDS = (
+    'apple banana cat dog elephant fish guitar house island jacket kite lemon '
+    'mountain notebook orange pencil queen rabbit sun tree umbrella violin '
+    'window xylophone yacht zebra bread chair door egg flower glass hat ice '
+    'juice key lamp milk nest owl pear ring shoe table train water book bird'
+).split()
+
+
+def make_corpus(count=48, seed=7, min_size=600, max_size=2400):
+    """
+    Generate distinct JPEG 'photos' of varied sizes: random rectangles and
+    ellipses over a gradient, so their perceptual hashes differ.
+
+    Returns:
+        list: JPEG bytes
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        width, height = rng.randint(min_size, max_size), rng.randint(min_size, max_size)
+        img = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+        draw = ImageDraw.Draw(img)
+        for _ in range(12):
+            x0, y0 = rng.randrange(width), rng.randrange(height)
+            box = (x0, y0, x0 + rng.randint(50, width // 2), y0 + rng.randint(50, height // 2))
+            color = tuple(rng.randrange(256) for _ in range(3))
+            (draw.rectangle if rng.random() < 0.5 else draw.ellipse)(box, fill=color)
+        buffer = BytesIO()
+        img.save(buffer, format='JPEG', quality=88)
+        corpus.append(buffer.getvalue())
+    return corpus
+
+
+def _parse_value(value):
+    if value == 'null':
+        return None
+    if value in ('true', 'false'):
+        return value == 'true'
+    return value
+
+def _predicate(op, value):
+    """Build a test for one PostgREST filter, e.g. ('gt', '10')."""
+    if op == 'in':
+        options = {v.strip('"') for v in re.findall(r'"(?:[^"\\]|\\.)*"|[^,]+', value.strip('()'))}
+        return lambda field: str(field) in options
+    return lambda field: _compare(field, op, value)
+
+def _compare(field, op, value):
+    if op == 'is':
+        return field is _parse_value(value) or field == _parse_value(value)
+    target = _parse_value(value)
+    if isinstance(field, bool) or target is None or isinstance(target, bool):
+        return op == 'eq' and field == target or op == 'neq' and field != target
+    if isinstance(field, (int, float)):
+        target = float(target)
+    else:
+        field = str(field)
+    return {
+        'eq': field == target, 'neq': field != target, 'gt': field > target,
+        'gte': field >= target, 'lt': field < target, 'lte': field <= target,
+    }[op]
+
+
+class FakePostgrest:
+    """In-memory tables with the filters, ordering and RPCs the apps use."""
+
+    def __init__(self, words=2000):
+        self.lock = threading.Lock()
+        self.tables = {'word-list': [], 'speech-therapy-s3-keys': [], 'scoreboard': []}
+        self.next_id = {name: 1 for name in self.tables}
+        for i in range(words):
+            base = SAMPLE_WORDS[i % len(SAMPLE_WORDS)]
+            word = base if i < len(SAMPLE_WORDS) else f'{base}{i // len(SAMPLE_WORDS)}'
+            self._insert('word-list', {'eng_word': word, 'is_used': False})
+
+    def _insert(self, table, row):
+        row = dict(row)
+        row.setdefault('id', self.next_id[table])
+        self.next_id[table] = max(self.next_id[table], row['id']) + 1
+        if table == 'speech-therapy-s3-keys':
+            row.setdefault('is_confirmed', None)
+        self.tables[table].append(row)
+        return row
+
+    def _select(self, table, params):
+        rows = self.tables[table]
+        for column, condition in params:
+            if column in ('select', 'order', 'limit', 'offset', 'on_conflict'):
+                continue
+            test = _predicate(*condition.split('.', 1))
+            rows = [row for row in rows if test(row.get(column))]
+        return rows
+
+    def handle(self, method, path, query, body, headers):
+        """
+        Returns:
+            tuple: (status, payload, extra headers)
+        """
+        table = path[len('/rest/v1/'):]
+        params = parse_qsl(query, keep_blank_values=True)
+        options = dict(params)
+        with self.lock:
+            if table.startswith('rpc/'):
+                return self._rpc(table[4:], body)
+            if table not in self.tables:
+                return 404, {'message': f'relation {table} does not exist'}, {}
+
+            if method == 'POST':
+                conflict = options.get('on_conflict')
+                existing = {row.get(conflict) for row in self.tables[table]} if conflict else set()
+                for row in body if isinstance(body, list) else [body]:
+                    # resolution=ignore-duplicates on a unique column
+                    if conflict and row.get(conflict) in existing:
+                        continue
+                    existing.add(row.get(conflict))
+                    self._insert(table, row)
+                return 201, None, {}
+
+            rows = self._select(table, params)
+            if method == 'PATCH':
+                for row in rows:
+                    row.update(body)
+                return 204, None, {}
+
+            if 'order' in options:
+                column, _, direction = options['order'].partition('.')
+                rows = sorted(rows, key=lambda row: (row.get(column) is None, row.get(column)),
+                              reverse=direction == 'desc')
+            total = len(rows)
+            offset = int(options.get('offset', 0))
+            rows = rows[offset:offset + int(options['limit'])] if 'limit' in options else rows[offset:]
+            if 'select' in options and options['select'] != '*':
+                columns = options['select'].split(',')
+                rows = [{column: row.get(column) for column in columns} for row in rows]
+            extra = {}
+            if 'count=exact' in headers.get('Prefer', ''):
+                extra['Content-Range'] = f'{offset}-{offset + len(rows) - 1}/{total}'
+            return 200, [dict(row) for row in rows], extra
+
+    def _rpc(self, function, body):
+        if function in ('claim_word', 'renew_word', 'release_word'):
+            return self._reservation(function, body)
+        if function == 'increment_score':
+            body = {'p_rows': [{'username': body['p_username'], 'accepted': body.get('p_accepted', 0),
+                                'rejected': body.get('p_rejected', 0)}]}
+        elif function != 'increment_scores':
+            return 404, {'message': f'function {function} not found'}, {}
+        for update in body['p_rows']:
+            row = next((row for row in self.tables['scoreboard'] if row['username'] == update['username']), None)
+            if row is None:
+                row = self._insert('scoreboard', {'username': update['username'], 'accepted': 0, 'rejected': 0})
+            row['accepted'] += update.get('accepted') or 0
+            row['rejected'] += update.get('rejected') or 0
+        return 204, None, {}
+
+    def _reservation(self, function, body):
+        """sql/word_reservations.sql, with reserved_until as a Unix time."""
+        now = time.time()
+        rows = self.tables['word-list']
+        if function == 'claim_word':
+            row = next((row for row in rows if not row.get('is_used')
+                        and (row.get('reserved_until') or 0) < now), None)
+            if row is None:
+                return 200, b'null', {}
+            row.update(reserved_by=body['p_owner'], reserved_until=now + body.get('p_lease_seconds', 1800))
+            return 200, row['eng_word'], {}
+        row = next((row for row in rows if row['eng_word'] == body['p_eng_word']), None)
+        if function == 'renew_word':
+            renewed = (row is not None and not row.get('is_used')
+                       and (row.get('reserved_by') == body['p_owner'] or (row.get('reserved_until') or 0) < now))
+            if renewed:
+                row.update(reserved_by=body['p_owner'], reserved_until=now + body.get('p_lease_seconds', 1800))
+            return 200, renewed, {}
+        if row is not None and row.get('reserved_by') == body['p_owner']:
+            row.update(reserved_by=None, reserved_until=None)
+        return 204, None, {}
+
+
+class FakeS3:
+    """Objects in a dict, keyed by (bucket, key)."""
+
+    def __init__(self):
+        self.objects = {}
+        self.lock = threading.Lock()
+
+    def handle(self, method, path, body, headers):
+        bucket, _, key = unquote(path.lstrip('/')).partition('/')
+        if method == 'PUT':
+            if 'aws-chunked' in headers.get('Content-Encoding', ''):
+                body = _decode_aws_chunked(body)
+            etag = '"' + hashlib.md5(body).hexdigest() + '"'
+            with self.lock:
+                self.objects[(bucket, key)] = (body, headers.get('Content-Type', 'binary/octet-stream'), etag)
+            return 200, b'', {'ETag': etag}
+        if method == 'DELETE':
+            with self.lock:
+                self.objects.pop((bucket, key), None)
+            return 204, b'', {}
+        with self.lock:
+            stored = self.objects.get((bucket, key))
+        if stored is None:
+            return 404, b'<Error><Code>NoSuchKey</Code></Error>', {'Content-Type': 'application/xml'}
+        data, content_type, etag = stored
+        if headers.get('If-None-Match') == etag:
+            return 304, b'', {'ETag': etag}
+        return 200, data if method == 'GET' else b'', {'Content-Type': content_type, 'ETag': etag,
+                                                       'Content-Length': str(len(data))}
+
+def _decode_aws_chunked(body):
+    # <hex size>[;chunk-signature=...]\r\n<data>\r\n ... 0\r\n<trailers>
+    out = BytesIO()
+    position = 0
+    while True:
+        line_end = body.index(b'\r\n', position)
+        size = int(body[position:line_end].split(b';')[0], 16)
+        if size == 0:
+            return out.getvalue()
+        out.write(body[line_end + 2:line_end + 2 + size])
+        position = line_end + 2 + size + 2
+
+
+def provider_payload(provider, word, base_url, corpus_size, per_page=10):
+    """Search results in each provider's JSON shape, pointing at /images/."""
+    seed = int(hashlib.md5(f'{provider}|{word}'.encode()).hexdigest(), 16)
+    rng = random.Random(seed)
+    images = [rng.randrange(corpus_size) for _ in range(per_page)]
+    url = lambda n: f'{base_url}/images/{n}.jpeg'
+    if provider == 'unsplash':
+        return {'results': [{'urls': {'regular': url(n), 'small': url(n)}, 'width': 1200, 'height': 900,
+                             'description': f'a {word}', 'alt_description': None, 'tags': [{'title': word}],
+                             'likes': rng.randint(0, 500)} for n in images]}
+    if provider == 'pexels':
+        return {'photos': [{'src': {'large2x': url(n), 'medium': url(n)}, 'width': 1200, 'height': 900,
+                            'alt': f'{word} photo'} for n in images]}
+    if provider == 'pixabay':
+        return {'hits': [{'largeImageURL': url(n), 'webformatURL': url(n), 'imageWidth': 1200,
+                          'imageHeight': 900, 'tags': word, 'views': rng.randint(0, 10 ** 5),
+                          'downloads': rng.randint(0, 10 ** 4), 'likes': rng.randint(0, 100)} for n in images]}
+    return {'results': [{'properties': {'url': url(n), 'width': 1200, 'height': 900},
+                         'thumbnail': {'src': url(n)}, 'title': word} for n in images]}
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, address, latency=None, error_rate=0.0, words=2000, corpus_size=48):
+        super().__init__(address, StandinHandler)
+        self.latency = dict(DEFAULT_LATENCY, **(latency or {}))
+        self.error_rate = error_rate
+        self.postgrest = FakePostgrest(words)
+        self.s3 = FakeS3()
+        self.corpus = make_corpus(corpus_size)
+        self.base_url = f'http://{address[0]}:{self.server_address[1]}'
+        self.request_counts = {}
+        self._counts_lock = threading.Lock()
+
+    def count(self, service):
+        with self._counts_lock:
+            self.request_counts[service] = self.request_counts.get(service, 0) + 1
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _send(self, status, body=b'', headers=None, content_type='application/json'):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        headers = dict(headers or {})
+        headers.setdefault('Content-Type', content_type)
+        headers['Content-Length'] = str(len(body)) if status != 304 else '0'
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD' and status != 304:
+            self.wfile.write(body)
+
+    def _service(self, path):
+        if path.startswith('/rest/v1/'):
+            return 'supabase'
+        if path.startswith('/providers/'):
+            return 'provider'
+        if path.startswith('/images/'):
+            return 'image'
+        if path.startswith('/translate'):
+            return 'translate'
+        return 's3'
+
+    def _handle(self):
+        server = self.server
+        url = urlsplit(self.path)
+        body = self._body()
+        service = self._service(url.path)
+        server.count(service)
+        time.sleep(server.latency.get(service, 0) / 1000)
+        if server.error_rate and random.random() < server.error_rate:
+            return self._send(503, {'message': 'injected failure'})
+
+        if service == 'supabase':
+            payload = json.loads(body) if body else None
+            status, result, extra = server.postgrest.handle(self.command, url.path, url.query, payload,
+                                                            self.headers)
+            return self._send(status, result, extra)
+        if service == 'provider':
+            provider = url.path.split('/')[2]
+            query = dict(parse_qsl(url.query))
+            word = query.get('query') or query.get('q') or ''
+            return self._send(200, provider_payload(provider, word, server.base_url, len(server.corpus)))
+        if service == 'image':
+            n = int(url.path.rsplit('/', 1)[1].split('.')[0])
+            return self._send(200, server.corpus[n % len(server.corpus)], content_type='image/jpeg')
+        if service == 'translate':
+            payload = json.loads(body)
+            texts = payload['q'] if isinstance(payload['q'], list) else [payload['q']]
+            return self._send(200, {'data': {'translations': [
+                {'translatedText': f'{text}-tr'} for text in texts
+            ]}})
+        status, data, headers = server.s3.handle(self.command, url.path, body, self.headers)
+        return self._send(status, data, headers, content_type='application/xml')
+
+    do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = do_HEAD = _handle
+
+
+def parse_latency(text):
+    """'supabase=40,provider=150' -> {'supabase': 40.0, 'provider': 150.0}"""
+    latency = {}
+    for part in filter(None, (text or '').split(',')):
+        service, _, ms = part.partition('=')
+        latency[service.strip()] = float(ms)
+    return latency
+
+def start(port=0, latency=None, error_rate=0.0, words=2000):
+    """Run the stand-ins on a background thread; returns the server."""
+    server = StandinServer(('127.0.0.1', port), latency, error_rate, words)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--latency', default='', help='per-service ms, e.g. supabase=40,provider=150')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--words', type=int, default=2000)
+    args = parser.parse_args()
+
+    server = StandinServer(('127.0.0.1', args.port), parse_latency(args.latency), args.error_rate, args.words)
+    print(f"stand-ins on {server.base_url}, latency {server.latency}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
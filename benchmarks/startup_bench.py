@@ -0,0 +1,81 @@
+"""
+Startup benchmark: import time of each app, from `python -X importtime`,
+checked against a budget so CI can fail on regressions.
+
+Each module is imported in a fresh interpreter --runs times and the best
+run is kept. Besides the total, heavy modules that should only load on
+first use (Google Translate, boto3, Pillow) must not appear at all.
+
+    python benchmarks/startup_bench.py --budget-ms 350
+    python benchmarks/startup_bench.py --module pair_reviewer --top 15
+
+Exits with status 1 when a module is over budget or imports a lazy module.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Imported on first use (or by the warm-up after the port is bound), never
+# while the app module itself is imported
+LAZY_MODULES = ('google.cloud.translate_v2', 'boto3', 'PIL.Image')
+
+
+def import_profile(module):
+    """
+    Import a module in a fresh interpreter under -X importtime.
+
+    Returns:
+        tuple: (total microseconds, {module name: cumulative microseconds})
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True,
+        env=dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    cumulative = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        # "import time: <self us> | <cumulative us> | <indented name>"
+        _, cumulative_us, name = line.split('|', 2)
+        indent = len(name) - len(name.lstrip())
+        cumulative[name.strip()] = int(cumulative_us)
+        # Top-level imports start after a single space
+        if indent == 1:
+            total += int(cumulative_us)
+    return total, cumulative
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', action='append', help='module to import (default: app and pair_reviewer)')
+    parser.add_argument('--budget-ms', type=float, default=float(os.getenv('STARTUP_BUDGET_MS', 350)))
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=10, help='slowest imports to list')
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.module or ['app', 'pair_reviewer']:
+        runs = [import_profile(module) for _ in range(args.runs)]
+        total, cumulative = min(runs, key=lambda run: run[0])
+        over = total / 1000 > args.budget_ms
+        eager = [name for name in LAZY_MODULES if name in cumulative]
+        status = 'OVER BUDGET' if over else 'ok'
+        print(f"{module}: {total / 1000:.0f} ms (budget {args.budget_ms:.0f} ms) {status}")
+        if eager:
+            print(f"  imported eagerly, should be lazy: {', '.join(eager)}")
+        for name, us in sorted(cumulative.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {us / 1000:>8.1f} ms  {name}")
+        failed = failed or over or bool(eager)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
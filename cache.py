@@ -0,0 +1,361 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+from cachetools import LRUCache
+
+# 'sqlite' shares entries between workers on the host; 'local' keeps every
+# cache in-process only
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'sqlite')
+CACHE_PATH = os.getenv('CACHE_PATH', 'shared_cache.sqlite3')
+# How long a worker may hold the right to load a key before others give up
+# waiting for it and load it themselves
+CACHE_LOAD_TIMEOUT = float(os.getenv('CACHE_LOAD_TIMEOUT', 10))
+CACHE_POLL_INTERVAL = 0.05
+# Expired entries are deleted, and each cache trimmed to its shared_maxsize
+# (oldest writes first), at most this often per process
+CACHE_PURGE_INTERVAL = float(os.getenv('CACHE_PURGE_INTERVAL', 300))
+CACHE_SHARED_MAXSIZE = int(os.getenv('CACHE_SHARED_MAXSIZE', 100000))
+
+_MISSING = object()
+
+
+class SQLiteStore:
+    """
+    Shared tier: one SQLite WAL file holding JSON values for every cache on
+    the host, plus short-lived load leases for cross-worker single-flight.
+
+    Another store (e.g. Redis) only needs get_many, set_many, delete,
+    try_lease, release_lease and set_limit with the same meaning.
+    """
+
+    def __init__(self, path=CACHE_PATH, purge_interval=CACHE_PURGE_INTERVAL):
+        self.path = path
+        self.purge_interval = purge_interval
+        self._local = threading.local()
+        self._limits = {}  # namespace -> max entries
+        self._purged_at = time.time()
+        self._purge_lock = threading.Lock()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " expires_at REAL, updated_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_age ON entries (namespace, updated_at)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, owner TEXT NOT NULL,"
+                " expires_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+            )
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, namespace, keys):
+        """
+        Returns:
+            dict: key -> (value, expires_at) for the keys present and not
+                expired; expires_at is None for entries without a TTL
+        """
+        conn = self._connect()
+        now = time.time()
+        found = {}
+        keys = list(keys)
+        # Stay well under SQLite's bound-parameter limit
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = conn.execute(
+                f"SELECT key, value, expires_at FROM entries"
+                f" WHERE namespace = ? AND key IN ({','.join('?' * len(chunk))})",
+                [namespace, *chunk],
+            ).fetchall()
+            for key, value, expires_at in rows:
+                if expires_at is None or expires_at > now:
+                    found[key] = (json.loads(value), expires_at)
+        return found
+
+    def set_many(self, namespace, items, ttl=None):
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        self._connect().executemany(
+            "INSERT OR REPLACE INTO entries (namespace, key, value, expires_at, updated_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            [(namespace, key, json.dumps(value), expires_at, now) for key, value in items],
+        )
+        self._maybe_purge(now)
+
+    def set_limit(self, namespace, max_entries):
+        """Bound a namespace to max_entries; enforced by purge_expired."""
+        self._limits[namespace] = max_entries
+
+    def delete(self, namespace, key):
+        self._connect().execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def purge_expired(self):
+        """Delete expired entries and leases, then trim namespaces over their limit."""
+        conn = self._connect()
+        now = time.time()
+        conn.execute("DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        conn.execute("DELETE FROM leases WHERE expires_at <= ?", (now,))
+        for namespace, max_entries in list(self._limits.items()):
+            count = conn.execute("SELECT COUNT(*) FROM entries WHERE namespace = ?", (namespace,)).fetchone()[0]
+            if count > max_entries:
+                conn.execute(
+                    "DELETE FROM entries WHERE rowid IN (SELECT rowid FROM entries"
+                    " WHERE namespace = ? ORDER BY updated_at LIMIT ?)",
+                    (namespace, count - max_entries),
+                )
+
+    def _maybe_purge(self, now):
+        if now - self._purged_at < self.purge_interval or not self._purge_lock.acquire(blocking=False):
+            return
+        try:
+            self._purged_at = now
+            self.purge_expired()
+        finally:
+            self._purge_lock.release()
+
+    def try_lease(self, namespace, key, owner, seconds):
+        """
+        Returns:
+            bool: True if this owner may load the key, False if another
+                worker is loading it
+        """
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT owner, expires_at FROM leases WHERE namespace = ? AND key = ?",
+                               (namespace, key)).fetchone()
+            if row is not None and row[0] != owner and row[1] > now:
+                conn.execute("COMMIT")
+                return False
+            conn.execute("INSERT OR REPLACE INTO leases (namespace, key, owner, expires_at) VALUES (?, ?, ?, ?)",
+                         (namespace, key, owner, now + seconds))
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def release_lease(self, namespace, key, owner):
+        self._connect().execute("DELETE FROM leases WHERE namespace = ? AND key = ? AND owner = ?",
+                                (namespace, key, owner))
+
+
+class Cache:
+    """
+    Two-tier cache: an in-process LRU (or TTL) cache in front of the
+    shared store, so every worker on the host sees what any worker loaded.
+
+    get_or_set loads a missing key once: concurrent callers in the process
+    wait on the same load, and callers in other workers wait for the
+    shared entry while its lease is held. Values must be JSON-serialisable.
+
+    Local entries expire when their shared entry does; the shared tier
+    keeps at most shared_maxsize entries for this cache.
+    """
+
+    def __init__(self, name, maxsize=1024, ttl=None, store=None, shared=True,
+                 shared_maxsize=CACHE_SHARED_MAXSIZE):
+        self.name = name
+        self.ttl = ttl
+        self._local = LRUCache(maxsize=maxsize)  # key -> (value, expires_at or None)
+        self._store = (store or get_store()) if shared else None
+        if self._store is not None:
+            self._store.set_limit(name, shared_maxsize)
+        self._lock = threading.Lock()
+        self._loading = {}  # key -> Future of the in-process load
+        self._owner = uuid.uuid4().hex
+        self.stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'loads': 0, 'waits': 0, 'errors': 0}
+        caches[name] = self
+
+    def _count(self, stat, n=1):
+        with self._lock:
+            self.stats[stat] += n
+
+    def _shared_get_many(self, keys):
+        if self._store is None or not keys:
+            return {}
+        try:
+            return self._store.get_many(self.name, keys)
+        except sqlite3.Error as e:
+            self._count('errors')
+            print(f"Shared cache {self.name} read failed: {e}")
+            return {}
+
+    def _shared_set_many(self, items, ttl):
+        if self._store is None or not items:
+            return
+        try:
+            self._store.set_many(self.name, items, ttl)
+        except sqlite3.Error as e:
+            self._count('errors')
+            print(f"Shared cache {self.name} write failed: {e}")
+
+    def get_many(self, keys):
+        """
+        Returns:
+            dict: key -> value for every key found in either tier
+        """
+        found = {}
+        missing = []
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                entry = self._local.get(key)
+                if entry is not None and (entry[1] is None or entry[1] > now):
+                    found[key] = entry[0]
+                else:
+                    missing.append(key)
+            self.stats['local_hits'] += len(found)
+        shared = self._shared_get_many(missing)
+        with self._lock:
+            # Keep the shared expiry, so no worker serves an entry longer
+            # than the worker that stored it intended
+            self._local.update(shared)
+            self.stats['shared_hits'] += len(shared)
+            self.stats['misses'] += len(missing) - len(shared)
+        found.update((key, value) for key, (value, _) in shared.items())
+        return found
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def set_many(self, items, ttl=None):
+        """Store (key, value) pairs in both tiers."""
+        items = list(items)
+        ttl = ttl or self.ttl
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            for key, value in items:
+                self._local[key] = (value, expires_at)
+        self._shared_set_many(items, ttl)
+
+    def set(self, key, value, ttl=None):
+        self.set_many([(key, value)], ttl)
+
+    def delete(self, key):
+        with self._lock:
+            self._local.pop(key, None)
+        if self._store is not None:
+            self._store.delete(self.name, key)
+
+    def get_or_set(self, key, loader, ttl=None, cache_if=None):
+        """
+        Return the cached value for key, or load, store and return it.
+
+        Args:
+            key (str): Cache key
+            loader (callable): Called with no arguments on a miss
+            ttl (float, optional): Overrides the cache's TTL for this value
+            cache_if (callable, optional): Values for which it returns
+                False are returned but not stored (e.g. empty results)
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            future = self._loading.get(key)
+            leader = future is None
+            if leader:
+                future = self._loading[key] = Future()
+        if not leader:
+            self._count('waits')
+            return future.result()
+
+        try:
+            value = self._load(key, loader, ttl, cache_if)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+
+    def _shared_lookup(self, key):
+        """Read one key from the shared tier into the local one, without counting it."""
+        entry = self._shared_get_many([key]).get(key)
+        if entry is None:
+            return _MISSING
+        with self._lock:
+            self._local[key] = entry
+        return entry[0]
+
+    def _try_lease(self, key):
+        try:
+            return self._store.try_lease(self.name, key, self._owner, CACHE_LOAD_TIMEOUT)
+        except sqlite3.Error:
+            return True
+
+    def _load(self, key, loader, ttl, cache_if):
+        if self._store is not None:
+            leased = self._try_lease(key)
+            if not leased:
+                # Another worker is loading it: wait for the shared entry, or
+                # for the lease to go away without one (the loader failed or
+                # the value was not cacheable) and load it ourselves
+                self._count('waits')
+                deadline = time.monotonic() + CACHE_LOAD_TIMEOUT
+                while not leased and time.monotonic() < deadline:
+                    time.sleep(CACHE_POLL_INTERVAL)
+                    value = self._shared_lookup(key)
+                    if value is not _MISSING:
+                        return value
+                    leased = self._try_lease(key)
+                # The leader stores before releasing, so check once more
+                value = self._shared_lookup(key) if leased else _MISSING
+                if value is not _MISSING:
+                    self._release(key)
+                    return value
+
+        try:
+            self._count('loads')
+            value = loader()
+            if cache_if is None or cache_if(value):
+                self.set(key, value, ttl)
+            return value
+        finally:
+            if self._store is not None:
+                self._release(key)
+
+    def _release(self, key):
+        try:
+            self._store.release_lease(self.name, key, self._owner)
+        except sqlite3.Error:
+            pass
+
+
+caches = {}
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """Return the shared store for CACHE_BACKEND, or None for 'local'."""
+    global _store
+    if CACHE_BACKEND == 'local':
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SQLiteStore()
+    return _store
+
+def cache_stats():
+    """
+    Returns:
+        dict: cache name -> hit/miss counters and local size
+    """
+    return {name: dict(cache.stats, size=len(cache._local)) for name, cache in caches.items()}
@@ -1,9 +1,23 @@
-import requests
-import boto3
+import http_client
 import os
+import atexit
+import random
+import sqlite3
+import threading
+import time
 import uuid
 from io import BytesIO
-from PIL import Image
+from urllib.parse import quote
+
+from image_processing import (
+    CONTENT_TYPES, download_image, process_image, process_image_offloaded,
+    process_derivatives_offloaded
+)
+from cache import Cache
+from image_hash import dhash, hash_index
+from instrumentation import span
+from leaderboard import leaderboard
+from storage import copy_object, upload_many
 
 SUPABASE_PB_KEY = os.getenv('SUPABASE_ANON_PUBLIC_KEY')
 SUPABASE_URL = os.getenv('SUPABASE_PROJECT_URL')
@@ -11,10 +25,25 @@ SUPABASE_TABLE = 'speech-therapy-s3-keys'
 SCOREBOARD_TABLE = 'scoreboard'
 WORD_LIST_TABLE = 'word-list'
 
-AWS_ACCESS_KEY = os.getenv('AWS_ACCESS_KEY')
-AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')
 
-def supabase_request(method, table, data=None, query_params=None):
+# Scoreboard: merge increments locally and flush them in batches
+SCOREBOARD_WRITE_BEHIND = os.getenv('SCOREBOARD_WRITE_BEHIND', '0') == '1'
+SCOREBOARD_FLUSH_INTERVAL = float(os.getenv('SCOREBOARD_FLUSH_INTERVAL', 5))
+
+# What to do when an accepted image matches one already stored: flag, skip or off
+IMAGE_DUPLICATE_POLICY = os.getenv('IMAGE_DUPLICATE_POLICY', 'flag')
+
+# Word pool: monotonically increasing key column used for paging and resync
+WORD_LIST_KEY_COLUMN = os.getenv('WORD_LIST_KEY_COLUMN', 'id')
+WORD_POOL_PAGE_SIZE = int(os.getenv('WORD_POOL_PAGE_SIZE', 1000))
+WORD_POOL_TTL = int(os.getenv('WORD_POOL_TTL', 300))
+# Reload the whole pool when more than this share of sampled words turn out
+# to be used already (marked by pregenerate.py or other workers), judged
+# over at least WORD_POOL_STALE_MIN_CHECKS samples
+WORD_POOL_STALE_RATIO = float(os.getenv('WORD_POOL_STALE_RATIO', 0.5))
+WORD_POOL_STALE_MIN_CHECKS = 20
+
+def supabase_request(method, table, data=None, query_params=None, extra_headers=None):
     """
     Generic function to interact with Supabase.
     
@@ -23,6 +52,7 @@ def supabase_request(method, table, data=None, query_params=None):
         table: Supabase table name
         data: Data to send (for POST, PATCH)
         query_params: Query parameters to append to URL
+        extra_headers: Additional headers, e.g. PostgREST `Prefer` or `Range`
         
     Returns:
         Response from Supabase API
@@ -32,31 +62,74 @@ def supabase_request(method, table, data=None, query_params=None):
         "Authorization": f"Bearer {SUPABASE_PB_KEY}",
         "Content-Type": "application/json"
     }
+    if extra_headers:
+        headers.update(extra_headers)
     
     url = f"{SUPABASE_URL}/rest/v1/{table}"
     if query_params:
         url += f"?{query_params}"
     
-    if method == 'GET':
-        return requests.get(url, headers=headers)
-    elif method == 'POST':
-        return requests.post(url, headers=headers, json=data)
-    elif method == 'PATCH':
-        return requests.patch(url, headers=headers, json=data)
+    with span('supabase.' + table.replace('/', '.')):
+        if method == 'GET':
+            return http_client.get(url, headers=headers)
+        elif method == 'POST':
+            return http_client.post(url, headers=headers, json=data)
+        elif method == 'PATCH':
+            return http_client.patch(url, headers=headers, json=data)
 
-def save_to_supabase(s3_key, word, translation): 
+def in_filter(values):
+    """
+    Build a PostgREST `in.(...)` filter value, URL-encoded.
+    
+    Every value is double-quoted with backslashes and quotes escaped, so
+    commas, parentheses or quotes inside a value cannot split the list.
+    """
+    quoted = ','.join('"{}"'.format(value.replace('\\', '\\\\').replace('"', '\\"')) for value in values)
+    return 'in.' + quote(f'({quoted})', safe='(),')
+
+# Columns added by sql/ migrations; dropped from inserts until they exist
+OPTIONAL_COLUMNS = ('derivatives', 'duplicate_of')
+
+def save_to_supabase(s3_key, word, translation, derivatives=None, duplicate_of=None): 
     data = {
         's3_key': s3_key, 
         "eng_word": word,
         "tr_word": translation  
     }
+    if derivatives:
+        # '{size}.{ext}' -> s3_key, see sql/derivatives.sql
+        data['derivatives'] = derivatives
+    if duplicate_of:
+        # Near-duplicate of an image already stored, see sql/image_hash.sql
+        data['duplicate_of'] = duplicate_of
     
-    return supabase_request('POST', SUPABASE_TABLE, data=data)
+    response = supabase_request('POST', SUPABASE_TABLE, data=data)
+    missing = [column for column in OPTIONAL_COLUMNS
+               if column in data and column in response.text] if response.status_code == 400 else []
+    if missing:
+        # Column not added yet; keep the row, lose only the optional fields
+        for column in missing:
+            del data[column]
+        response = supabase_request('POST', SUPABASE_TABLE, data=data)
+    return response
 
-def update_scoreboard(username, action):
+def supabase_rpc(function, params):
     """
-    Update the scoreboard in Supabase for a user.
-    Action should be either 'accepted' or 'rejected'.
+    Call a Postgres function exposed by PostgREST under /rpc.
+    
+    Args:
+        function: Function name, see sql/
+        params: Named arguments as a dict
+        
+    Returns:
+        Response from Supabase API
+    """
+    return supabase_request('POST', f"rpc/{function}", data=params)
+
+def _update_scoreboard_read_modify_write(username, action):
+    """
+    Legacy GET-then-PATCH update, used only when the increment_score
+    function has not been deployed. Concurrent clicks can lose increments.
     """
     # First check if the user exists
     response = supabase_request('GET', SCOREBOARD_TABLE, 
@@ -82,9 +155,122 @@ def update_scoreboard(username, action):
         
         return supabase_request('POST', SCOREBOARD_TABLE, data=new_user)
 
-def get_scoreboard():
+# RPCs that answered 404 (sql/ not applied); not called again by this process
+_missing_functions = set()
+
+def increment_score(username, accepted=0, rejected=0):
+    """
+    Atomically add to a user's counters with one upsert round trip.
+    Falls back to read-modify-write if the RPC is missing (HTTP 404), and
+    stays on it for the life of the process.
+    """
+    if 'increment_score' not in _missing_functions:
+        response = supabase_rpc('increment_score', {
+            "p_username": username,
+            "p_accepted": accepted,
+            "p_rejected": rejected
+        })
+        if response.status_code != 404:
+            return response
+        print("increment_score is not deployed, using read-modify-write (see sql/increment_score.sql)")
+        _missing_functions.add('increment_score')
+    for action, count in (('accepted', accepted), ('rejected', rejected)):
+        for _ in range(count):
+            response = _update_scoreboard_read_modify_write(username, action)
+    return response
+
+class ScoreboardBuffer:
+    """
+    Write-behind buffer for scoreboard increments.
+    
+    Increments are merged per user in memory and flushed every
+    `interval` seconds as one increment_scores upsert for all users.
+    Counts still in the buffer are lost if the process is killed; a
+    clean exit flushes them.
+    """
+    
+    def __init__(self, interval=SCOREBOARD_FLUSH_INTERVAL):
+        self.interval = interval
+        self._pending = {}  # username -> [accepted, rejected]
+        self._lock = threading.Lock()
+        self._thread = None
+    
+    def add(self, username, action):
+        with self._lock:
+            counts = self._pending.setdefault(username, [0, 0])
+            counts[0 if action == 'accepted' else 1] += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._flush_loop,
+                                                name='scoreboard-flush', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+    
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        rows = [{"username": username, "accepted": accepted, "rejected": rejected}
+                for username, (accepted, rejected) in pending.items()]
+        unapplied = list(rows)
+        try:
+            if 'increment_scores' in _missing_functions:
+                self._increment_each(unapplied)
+                return
+            response = supabase_rpc('increment_scores', {"p_rows": rows})
+            if response.status_code == 404:
+                _missing_functions.add('increment_scores')
+                self._increment_each(unapplied)
+            elif response.status_code not in (200, 204):
+                raise Exception(f"status {response.status_code}")
+        except Exception as e:
+            print(f"Scoreboard flush failed, keeping counts for the next flush: {e}")
+            with self._lock:
+                for row in unapplied:
+                    counts = self._pending.setdefault(row['username'], [0, 0])
+                    counts[0] += row['accepted']
+                    counts[1] += row['rejected']
+    
+    @staticmethod
+    def _increment_each(unapplied):
+        """Write rows one by one, dropping each from `unapplied` once it is stored."""
+        while unapplied:
+            row = unapplied[0]
+            response = increment_score(row['username'], row['accepted'], row['rejected'])
+            if response is not None and response.status_code not in (200, 201, 204):
+                raise Exception(f"increment_score for {row['username']}: status {response.status_code}")
+            unapplied.pop(0)
+    
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+scoreboard_buffer = ScoreboardBuffer()
+
+def update_scoreboard(username, action):
+    """
+    Update the scoreboard in Supabase for a user.
+    Action should be either 'accepted' or 'rejected'.
+    """
+    accepted = 1 if action == 'accepted' else 0
+    rejected = 1 if action == 'rejected' else 0
+    
+    # Show the click on this host's leaderboard right away
+    try:
+        leaderboard.apply(username, accepted=accepted, rejected=rejected)
+    except sqlite3.Error as e:
+        print(f"Leaderboard cache update failed: {e}")
+    
+    if SCOREBOARD_WRITE_BEHIND:
+        scoreboard_buffer.add(username, action)
+        return None
+    return increment_score(username, accepted=accepted, rejected=rejected)
+
+def _get_scoreboard_from_supabase():
     """
     Fetch scoreboard data from Supabase, calculate totals, and sort by total.
+    Returns None if the request failed.
     """
     response = supabase_request('GET', SCOREBOARD_TABLE, query_params="select=*")
     
@@ -93,54 +279,363 @@ def get_scoreboard():
         
         # Calculate total for each user
         for user in users:
-            user['total'] = user.get('accepted', 0) + user.get('rejected', 0)
+            user['total'] = (user.get('accepted') or 0) + (user.get('rejected') or 0)
         
         # Sort by total in descending order
         users.sort(key=lambda x: x['total'], reverse=True)
         
         return users
-    else:
-        # Return empty list if there was an error
-        return []
+    return None
+
+def get_scoreboard(limit=None):
+    """
+    Return scoreboard rows with totals, highest total first.
+    
+    Reads come from the host-local leaderboard cache, which is refreshed
+    from Supabase at most once per LEADERBOARD_TTL across all workers.
+    """
+    try:
+        if not leaderboard.is_fresh() and leaderboard.claim_refresh():
+            users = _get_scoreboard_from_supabase()
+            if users is None:
+                leaderboard.expire()
+            else:
+                leaderboard.replace_all(users)
+        return leaderboard.top(limit)
+    except sqlite3.Error as e:
+        print(f"Leaderboard cache unavailable, reading Supabase: {e}")
+        users = _get_scoreboard_from_supabase() or []
+        return users[:limit] if limit is not None else users
+
+def resize_image(img_data, max_size=800):
+    """
+    Resize raw image bytes to fit in max_size pixels and encode as JPEG.
+    
+    Returns:
+        BytesIO: Encoded image, positioned at the start
+    """
+    return BytesIO(process_image_offloaded(img_data, max_size))
 
 def upload_to_s3(image_url, translation):
-    img_data = requests.get(image_url).content
+    """
+    Download, resize and upload an image.
+    
+    Returns:
+        str: s3_key of the 800px JPEG
+    """
+    return upload_derivatives_to_s3(image_url, translation)['s3_key']
+
+def upload_derivatives_to_s3(image_url, translation):
+    """
+    Download an image, build every derivative in one decode and upload
+    them in parallel.
+    
+    The 800px JPEG keeps the original '{translation}-{uuid}.jpeg' key so
+    existing readers of s3_key are unaffected; the others are stored as
+    '{translation}-{uuid}-{size}.{ext}'.
+    
+    Near-duplicates of stored images are handled by IMAGE_DUPLICATE_POLICY:
+    'flag' uploads and reports it, 'skip' copies the stored object to a new
+    key for this row instead of uploading (so a false match stores the
+    other image), 'off' ignores the hash index. Every row gets its own key.
+    
+    Returns:
+        dict: {'s3_key': main key, 'derivatives': {'{size}.{ext}': s3_key},
+               'duplicate_of': s3_key of a near-duplicate or None}
+    """
+    img_data = download_image(image_url)
+    
+    duplicate_of = None
+    image_hash = None
+    if IMAGE_DUPLICATE_POLICY != 'off':
+        image_hash = dhash(img_data)
+        near = hash_index.find_near(image_hash)
+        if near:
+            duplicate_of = near[0][1]
+            print(f"{image_url} looks like stored image {duplicate_of} (distance {near[0][0]})")
+    
     unique_id = uuid.uuid4()
+    base = f'{translation}-{unique_id}'
+    
+    if duplicate_of and IMAGE_DUPLICATE_POLICY == 'skip':
+        # Server-side copy: no resize or upload, but decisions on this row
+        # cannot touch the row that owns the original
+        copy_object(duplicate_of, f'{base}.jpeg')
+        return {'s3_key': f'{base}.jpeg', 'derivatives': None, 'duplicate_of': duplicate_of}
     
-    # Resize image before uploading
-    img = Image.open(BytesIO(img_data))
-    max_size = 800  # Maximum dimension in pixels
-    img.thumbnail((max_size, max_size))
+    derivatives = process_derivatives_offloaded(img_data)
     
-    # Save optimized image to buffer
-    buffer = BytesIO()
-    img.save(buffer, format="JPEG", quality=85, optimize=True)
-    buffer.seek(0)
+    keys = {}
+    objects = []
+    for name, body in derivatives.items():
+        size, ext = name.split('.')
+        key = f'{base}.jpeg' if name == '800.jpeg' else f'{base}-{size}.{ext}'
+        keys[name] = key
+        objects.append((key, BytesIO(body), CONTENT_TYPES[ext]))
+    if '800.jpeg' not in keys:
+        # Derivative sizes were reconfigured; still provide the main image
+        objects.append((f'{base}.jpeg', BytesIO(process_image(img_data)), 'image/jpeg'))
     
-    s3_key = f'{translation}-{unique_id}.jpeg'
+    uploaded, failed = upload_many(objects)
+    if failed:
+        raise Exception(f"S3 upload failed for {sorted(failed)}: {next(iter(failed.values()))}")
     
-    s3 = boto3.client('s3',
-                     aws_access_key_id=AWS_ACCESS_KEY,
-                     aws_secret_access_key=AWS_SECRET_ACCESS_KEY)
+    if image_hash is not None:
+        hash_index.add(f'{base}.jpeg', image_hash)
     
-    s3.put_object(Bucket='therapy-app-s3', Key=s3_key, Body=buffer, ContentType='image/jpeg')
-    return s3_key
+    return {'s3_key': f'{base}.jpeg', 'derivatives': keys, 'duplicate_of': duplicate_of}
 
-def get_unused_word():
+def upload_images_to_s3(images):
     """
-    Fetch a random unused word from Supabase.
+    Resize and upload many images at once, e.g. for backfills or re-encodes.
+    
+    Args:
+        images: Iterable of (s3_key, raw image bytes)
+        
+    Returns:
+        tuple: (uploaded keys, {s3_key: exception} for failures)
     """
-    response = supabase_request('GET', WORD_LIST_TABLE, query_params="is_used=eq.false&select=eng_word")
+    return upload_many((s3_key, resize_image(img_data), 'image/jpeg') for s3_key, img_data in images)
+
+# Word-list pages shared between workers, so only the first worker to
+# (re)load its pool reads the table from Supabase
+_word_list_pages = Cache('word_list_pages', maxsize=8, ttl=WORD_POOL_TTL)
+
+def _get_word_list_page(only_unused, after_key, page_size):
+    query = (f"select={WORD_LIST_KEY_COLUMN},eng_word"
+             f"&order={WORD_LIST_KEY_COLUMN}.asc&limit={page_size}")
+    if only_unused:
+        query += "&is_used=eq.false"
+    if after_key is not None:
+        query += f"&{WORD_LIST_KEY_COLUMN}=gt.{after_key}"
+    response = supabase_request('GET', WORD_LIST_TABLE, query_params=query)
+    if response.status_code != 200:
+        raise Exception(f"Word list page failed: {response.status_code}")
+    return response.json()
+
+def iter_word_list(only_unused=False, after_key=None, page_size=WORD_POOL_PAGE_SIZE, cached=False):
+    """
+    Stream word-list rows page by page, ordered by WORD_LIST_KEY_COLUMN.
+    
+    Args:
+        only_unused: Restrict to rows with is_used=false
+        after_key: Only rows whose key is greater than this value
+        page_size: Rows per request
+        cached: Read pages through the shared cache (up to WORD_POOL_TTL
+            old); empty pages are always fetched
+        
+    Yields:
+        list: A page of rows with the key column and eng_word
+    """
+    while True:
+        if cached:
+            rows = _word_list_pages.get_or_set(
+                f"{only_unused}:{after_key}:{page_size}",
+                lambda: _get_word_list_page(only_unused, after_key, page_size),
+                cache_if=bool
+            )
+        else:
+            rows = _get_word_list_page(only_unused, after_key, page_size)
+        if not rows:
+            return
+        yield rows
+        after_key = rows[-1][WORD_LIST_KEY_COLUMN]
+        if len(rows) < page_size:
+            return
+
+class WordPool:
+    """
+    In-process pool of unused words with O(1) random sampling and removal.
+    
+    The pool is loaded once in pages (keyset on WORD_LIST_KEY_COLUMN) and
+    then topped up every WORD_POOL_TTL seconds with rows newer than the
+    highest key seen, instead of re-reading the whole table. Pages come
+    through the shared cache, so other workers load from it rather than
+    from Supabase. Words marked as used here are dropped locally; words
+    marked by other processes are caught when a sampled word is re-checked
+    before it is handed out, and once they make up more than
+    WORD_POOL_STALE_RATIO of the samples the pool is reloaded from scratch.
+    """
+    
+    def __init__(self, ttl=WORD_POOL_TTL, page_size=WORD_POOL_PAGE_SIZE):
+        self.ttl = ttl
+        self.page_size = page_size
+        self._words = []   # eng_word values, sampled by index
+        self._index = {}   # lowercase eng_word -> position in _words
+        self._max_key = None
+        self._synced_at = 0
+        self._loaded = False
+        self._loading = False
+        self._discarded = None  # words discarded while a reload runs
+        self._checks = 0
+        self._stale = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def loaded(self):
+        return self._loaded
+    
+    def __len__(self):
+        return len(self._words)
+    
+    def _add(self, eng_word):
+        key = eng_word.lower()
+        if key not in self._index:
+            self._index[key] = len(self._words)
+            self._words.append(eng_word)
+    
+    def discard(self, eng_word):
+        """Remove a word by swapping it with the last entry."""
+        with self._lock:
+            if self._discarded is not None:
+                self._discarded.add(eng_word.lower())
+            pos = self._index.pop(eng_word.lower(), None)
+            if pos is None:
+                return
+            last = self._words.pop()
+            if pos < len(self._words):
+                self._words[pos] = last
+                self._index[last.lower()] = pos
+    
+    def sample(self):
+        with self._lock:
+            if not self._words:
+                return None
+            return random.choice(self._words)
+    
+    def note_check(self, stale):
+        """Count a re-checked sample; reload the pool when too many were stale."""
+        with self._lock:
+            self._checks += 1
+            self._stale += bool(stale)
+            if self._checks < WORD_POOL_STALE_MIN_CHECKS:
+                return
+            reload = self._stale > self._checks * WORD_POOL_STALE_RATIO
+            self._checks = self._stale = 0
+        if reload:
+            threading.Thread(target=self.reload, name='word-pool-reload', daemon=True).start()
+    
+    def sync(self):
+        """Load the pool, or fetch only rows added since the last sync."""
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = True
+            after_key = self._max_key
+        try:
+            for rows in iter_word_list(only_unused=True, after_key=after_key,
+                                       page_size=self.page_size, cached=True):
+                with self._lock:
+                    for row in rows:
+                        self._add(row['eng_word'])
+                    self._max_key = rows[-1][WORD_LIST_KEY_COLUMN]
+            with self._lock:
+                self._loaded = True
+                self._synced_at = time.time()
+        except Exception as e:
+            print(f"Word pool sync failed: {e}")
+        finally:
+            with self._lock:
+                self._loading = False
+    
+    def reload(self):
+        """
+        Re-read every unused word straight from Supabase (bypassing the page
+        cache) and swap it in, dropping words used since the pool was loaded.
+        """
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = True
+            self._discarded = set()
+        try:
+            words, max_key = [], None
+            for rows in iter_word_list(only_unused=True, page_size=self.page_size):
+                words.extend(row['eng_word'] for row in rows)
+                max_key = rows[-1][WORD_LIST_KEY_COLUMN]
+            with self._lock:
+                # Marked as used here while the pages were being read
+                discarded = self._discarded
+                self._words, self._index = [], {}
+                for eng_word in words:
+                    if eng_word.lower() not in discarded:
+                        self._add(eng_word)
+                self._max_key = max_key
+                self._loaded = True
+                self._synced_at = time.time()
+        except Exception as e:
+            print(f"Word pool reload failed: {e}")
+        finally:
+            with self._lock:
+                self._discarded = None
+                self._loading = False
+    
+    def sync_in_background(self):
+        """Start a sync if the pool is cold or older than the TTL."""
+        if self._loading:
+            return
+        if self._loaded and time.time() - self._synced_at < self.ttl:
+            return
+        threading.Thread(target=self.sync, name='word-pool-sync', daemon=True).start()
+
+word_pool = WordPool()
+
+def _is_word_unused(eng_word):
+    response = supabase_request('GET', WORD_LIST_TABLE,
+                                query_params=f"eng_word=eq.{eng_word}&is_used=eq.false&select=eng_word")
+    return response.status_code == 200 and bool(response.json())
+
+def _get_random_unused_word_from_server():
+    """
+    Pick a random unused word without downloading the table: count the
+    unused rows, then fetch a single row at a random offset.
+    """
+    response = supabase_request('GET', WORD_LIST_TABLE,
+                                query_params="is_used=eq.false&select=eng_word&limit=1",
+                                extra_headers={"Prefer": "count=exact"})
+    if response.status_code not in (200, 206):
+        return None
+    # Content-Range looks like "0-0/1234"
+    total = response.headers.get('Content-Range', '*/0').split('/')[-1]
+    if not total.isdigit() or int(total) == 0:
+        return None
+    offset = random.randrange(int(total))
+    response = supabase_request('GET', WORD_LIST_TABLE,
+                                query_params=f"is_used=eq.false&select=eng_word&limit=1&offset={offset}")
     if response.status_code == 200:
         words = response.json()
         if words:
-            import random
-            return random.choice(words)['eng_word']
+            return words[0]['eng_word']
     return None
 
+def get_unused_word(max_attempts=5):
+    """
+    Fetch a random unused word.
+    
+    Samples from the local word pool; while the pool is still loading, or
+    when max_attempts samples in a row were used already, falls back to a
+    single-row random query against Supabase.
+    """
+    word_pool.sync_in_background()
+    if not word_pool.loaded:
+        return _get_random_unused_word_from_server()
+    
+    for _ in range(max_attempts):
+        word = word_pool.sample()
+        if word is None:
+            break
+        # Another worker may have used it since we loaded the pool
+        unused = _is_word_unused(word)
+        word_pool.note_check(stale=not unused)
+        if unused:
+            return word
+        word_pool.discard(word)
+    return _get_random_unused_word_from_server()
+
 def mark_word_as_used(eng_word):
     """
     Set is_used=True for the given word in Supabase.
     """
+    word_pool.discard(eng_word)
     update_data = {"is_used": True}
     return supabase_request('PATCH', WORD_LIST_TABLE, data=update_data, query_params=f"eng_word=eq.{eng_word.lower()}")
@@ -0,0 +1,333 @@
+"""
+Bulk import of word lists into word-list, and export of the confirmed
+word/image pairs in speech-therapy-s3-keys.
+
+Both stream: the import reads its file and inserts one batch at a time,
+the export reads one keyset page at a time, so memory stays flat however
+large the file or table.
+
+    python dataset.py import words.csv --batch-size 1000
+    python dataset.py export pairs.jsonl --images images.tar --workers 8
+
+Imported words are lowercased the way mark_word_as_used matches them,
+deduplicated within each batch, and checked against existing rows before
+the insert; with sql/word_list_unique.sql applied the insert itself also
+ignores duplicates.
+"""
+import argparse
+import collections
+import csv
+import io
+import json
+import os
+import sys
+import tarfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from database import in_filter, supabase_request, SUPABASE_TABLE, WORD_LIST_TABLE
+from storage import get_object
+
+IMPORT_BATCH_SIZE = 1000
+# Words per existence check; keeps the in.(...) filter well under URL limits
+EXISTS_CHUNK_SIZE = 200
+EXPORT_PAGE_SIZE = 1000
+EXPORT_KEY_COLUMN = os.getenv('REVIEW_KEY_COLUMN', 'id')
+EXPORT_COLUMNS = ('s3_key', 'eng_word', 'tr_word', 'derivatives')
+# Column names accepted for the word in CSV headers and JSONL objects
+WORD_FIELDS = ('eng_word', 'word')
+
+
+def normalize_word(word):
+    """Strip and lowercase a word; returns None for blank input."""
+    word = (word or '').strip().lower()
+    return word or None
+
+def read_words(path, file_format=None):
+    """
+    Stream words from a CSV, JSONL or plain text file ('-' for stdin).
+
+    CSV files use the eng_word or word column if the header has one, else
+    the first column. JSONL lines may be strings or objects with eng_word
+    or word. Text files have one word per line.
+
+    Yields:
+        str: Normalized words, in file order
+    """
+    file_format = file_format or os.path.splitext(path)[1].lstrip('.').lower() or 'txt'
+    handle = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+    try:
+        if file_format == 'csv':
+            reader = csv.reader(handle)
+            header = next(reader, None)
+            if header is None:
+                return
+            lowered = [name.strip().lower() for name in header]
+            column = next((lowered.index(name) for name in WORD_FIELDS if name in lowered), None)
+            if column is None:
+                # No recognised header: the first row is data
+                column = 0
+                reader = (row for rows in ([header], reader) for row in rows)
+            for row in reader:
+                if len(row) > column and (word := normalize_word(row[column])):
+                    yield word
+        elif file_format in ('jsonl', 'ndjson'):
+            for line in handle:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                if isinstance(item, dict):
+                    item = next((item[name] for name in WORD_FIELDS if name in item), None)
+                if isinstance(item, str) and (word := normalize_word(item)):
+                    yield word
+        else:
+            for line in handle:
+                if word := normalize_word(line):
+                    yield word
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def existing_words(words):
+    """
+    Returns:
+        set: The words that already have a row in word-list
+    """
+    found = set()
+    for chunk in _batches(words, EXISTS_CHUNK_SIZE):
+        response = supabase_request('GET', WORD_LIST_TABLE,
+                                    query_params=f"select=eng_word&eng_word={in_filter(chunk)}")
+        if response.status_code != 200:
+            raise Exception(f"Word lookup failed: {response.status_code} {response.text}")
+        found.update(row['eng_word'].lower() for row in response.json())
+    return found
+
+def insert_words(words):
+    """
+    Insert new word-list rows in one request, ignoring rows whose word
+    already exists when the unique constraint is in place.
+
+    Returns:
+        Response from Supabase API
+    """
+    rows = [{'eng_word': word, 'is_used': False} for word in words]
+    response = supabase_request('POST', WORD_LIST_TABLE, data=rows,
+                                query_params='on_conflict=eng_word',
+                                extra_headers={'Prefer': 'resolution=ignore-duplicates,return=minimal'})
+    if response.status_code == 400 and 'constraint' in response.text:
+        # sql/word_list_unique.sql not applied yet; the rows were already
+        # checked against the table, so a plain insert is enough
+        response = supabase_request('POST', WORD_LIST_TABLE, data=rows,
+                                    extra_headers={'Prefer': 'return=minimal'})
+    return response
+
+def import_words(words, batch_size=IMPORT_BATCH_SIZE, dry_run=False):
+    """
+    Add words to word-list in batches.
+
+    Args:
+        words (iterable): Normalized words, e.g. from read_words
+        batch_size (int): Words per insert request
+        dry_run (bool): Count what would be inserted without writing
+
+    Returns:
+        dict: Counts of read, duplicate, existing and inserted words
+    """
+    counts = collections.Counter()
+    for batch in _batches(words, batch_size):
+        counts['read'] += len(batch)
+        unique = list(dict.fromkeys(batch))
+        counts['duplicate'] += len(batch) - len(unique)
+        # Earlier batches are already inserted, so this also catches
+        # repeats across batches without remembering every word
+        existing = existing_words(unique)
+        new = [word for word in unique if word not in existing]
+        counts['existing'] += len(existing)
+        if new and not dry_run:
+            response = insert_words(new)
+            if response.status_code not in (200, 201, 204):
+                raise Exception(f"Word insert failed: {response.status_code} {response.text}")
+        counts['inserted'] += len(new)
+        print(f"Imported {counts['inserted']} of {counts['read']} words", file=sys.stderr)
+    return dict(counts)
+
+def iter_confirmed_pairs(page_size=EXPORT_PAGE_SIZE):
+    """
+    Stream confirmed rows of speech-therapy-s3-keys by keyset pages.
+
+    Yields:
+        dict: One row at a time
+    """
+    after = None
+    while True:
+        query = f"select=*&is_confirmed=is.true&order={EXPORT_KEY_COLUMN}.asc&limit={page_size}"
+        if after is not None:
+            query += f"&{EXPORT_KEY_COLUMN}=gt.{after}"
+        response = supabase_request('GET', SUPABASE_TABLE, query_params=query)
+        if response.status_code != 200:
+            raise Exception(f"Export page failed: {response.status_code} {response.text}")
+        rows = response.json()
+        yield from rows
+        if len(rows) < page_size:
+            return
+        after = rows[-1][EXPORT_KEY_COLUMN]
+
+
+class ImageArchive:
+    """Append-only tar or zip file of exported images, chosen by extension."""
+
+    def __init__(self, path):
+        self.path = path
+        if path.endswith('.zip'):
+            # Images are already compressed
+            self._zip = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED)
+            self._tar = None
+        else:
+            self._tar = tarfile.open(path, 'w:gz' if path.endswith(('.tar.gz', '.tgz')) else 'w')
+            self._zip = None
+
+    def add(self, name, data):
+        if self._zip is not None:
+            self._zip.writestr(name, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self._tar.addfile(info, io.BytesIO(data))
+
+    def close(self):
+        (self._zip or self._tar).close()
+
+
+def _image_key(row, size=None):
+    if size:
+        derivative = (row.get('derivatives') or {}).get(size)
+        if derivative:
+            return derivative
+    return row['s3_key']
+
+def _fetch_image(key):
+    try:
+        return get_object(key), None
+    except Exception as e:
+        return None, e
+
+def export_pairs(out, file_format='jsonl', images=None, image_size=None, workers=8,
+                 page_size=EXPORT_PAGE_SIZE):
+    """
+    Write confirmed pairs to `out`, optionally bundling their images.
+
+    Images are downloaded by a pool of `workers` threads with at most
+    2 * workers downloads in flight, and written in row order, so memory
+    is bounded by that window rather than the table size.
+
+    Args:
+        out (file): Text file to write rows to
+        file_format (str): 'jsonl' or 'csv'
+        images (str, optional): Path of a .tar, .tar.gz or .zip to create
+        image_size (str, optional): Derivative to bundle, e.g. '800.jpeg';
+            rows without it fall back to s3_key
+        workers (int): Parallel image downloads
+
+    Returns:
+        dict: Counts of exported rows, bundled images and failed images
+    """
+    counts = collections.Counter()
+    writer = None
+    if file_format == 'csv':
+        writer = csv.DictWriter(out, fieldnames=EXPORT_COLUMNS + ('image',), extrasaction='ignore')
+        writer.writeheader()
+
+    def write_row(row, image_name=None):
+        row = {column: row.get(column) for column in EXPORT_COLUMNS}
+        row['image'] = image_name
+        if writer is not None:
+            if row['derivatives'] is not None:
+                row['derivatives'] = json.dumps(row['derivatives'])
+            writer.writerow(row)
+        else:
+            out.write(json.dumps(row, ensure_ascii=False) + '\n')
+        counts['rows'] += 1
+
+    if not images:
+        for row in iter_confirmed_pairs(page_size):
+            write_row(row)
+        return dict(counts)
+
+    archive = ImageArchive(images)
+    pending = collections.deque()
+
+    def drain(limit):
+        while len(pending) > limit:
+            row, key, future = pending.popleft()
+            data, error = future.result()
+            if error is not None:
+                print(f"Could not export image {key}: {error}", file=sys.stderr)
+                counts['failed_images'] += 1
+                write_row(row)
+                continue
+            name = f"images/{key}"
+            archive.add(name, data)
+            counts['images'] += 1
+            write_row(row, name)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='export') as executor:
+            for row in iter_confirmed_pairs(page_size):
+                key = _image_key(row, image_size)
+                pending.append((row, key, executor.submit(_fetch_image, key)))
+                drain(2 * workers)
+            drain(0)
+    finally:
+        archive.close()
+    return dict(counts)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = commands.add_parser('import', help='add words from a CSV, JSONL or text file')
+    import_parser.add_argument('path', help="word file, or '-' for stdin")
+    import_parser.add_argument('--format', choices=('csv', 'jsonl', 'txt'), help='default: from the extension')
+    import_parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+    import_parser.add_argument('--dry-run', action='store_true', help='count new words without inserting')
+
+    export_parser = commands.add_parser('export', help='write confirmed pairs as JSONL or CSV')
+    export_parser.add_argument('path', help="output file, or '-' for stdout")
+    export_parser.add_argument('--format', choices=('jsonl', 'csv'), help='default: from the extension')
+    export_parser.add_argument('--images', help='also bundle images into this .tar, .tar.gz or .zip')
+    export_parser.add_argument('--image-size', help="derivative to bundle, e.g. '800.jpeg' (default: original)")
+    export_parser.add_argument('--workers', type=int, default=8, help='parallel image downloads')
+    export_parser.add_argument('--page-size', type=int, default=EXPORT_PAGE_SIZE)
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        counts = import_words(read_words(args.path, args.format), args.batch_size, args.dry_run)
+    else:
+        file_format = args.format or ('csv' if args.path.endswith('.csv') else 'jsonl')
+        out = sys.stdout if args.path == '-' else open(args.path, 'w', newline='', encoding='utf-8')
+        try:
+            counts = export_pairs(out, file_format, args.images, args.image_size, args.workers, args.page_size)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+    print(json.dumps(counts), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""
+gunicorn settings, picked up automatically from the working directory
+(`gunicorn app:app`, `gunicorn pair_reviewer:app`).
+
+Requests spend almost all their time waiting on Supabase, the image
+providers, Google and S3, and the HTTP clients release the GIL while they
+wait. Threaded workers let one process serve many of those waits at once
+instead of pinning a whole sync worker per reviewer.
+"""
+import os
+import sys
+import threading
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+# Without FLASK_SECRET_KEY each process signs session cookies with its own
+# random key, so more than one worker would drop sessions between requests
+workers = int(os.getenv('GUNICORN_WORKERS', 2 if os.getenv('FLASK_SECRET_KEY') else 1))
+if workers > 1 and not os.getenv('FLASK_SECRET_KEY'):
+    sys.exit(f"GUNICORN_WORKERS={workers} needs FLASK_SECRET_KEY so every worker accepts the same sessions")
+# Concurrent requests per worker process
+threads = int(os.getenv('GUNICORN_THREADS', 32))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+keepalive = 5
+
+
+def post_worker_init(worker):
+    """
+    Heavy clients (Google Translate, boto3) are imported on first use to
+    keep startup short; warm them in the background as soon as the worker
+    is up, so the first request rarely waits for them.
+    """
+    module = sys.modules.get(getattr(worker.wsgi, 'import_name', ''))
+    warm_up = getattr(module, 'warm_up', None)
+    if warm_up:
+        threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) timeout in seconds when a caller does not pass one
+DEFAULT_TIMEOUT = (3.05, 10)
+# Per-host overrides, matched on the end of the hostname
+HOST_TIMEOUTS = {
+    'supabase.co': (3.05, 10),
+    'api.unsplash.com': (3.05, 5),
+    'api.pexels.com': (3.05, 5),
+    'pixabay.com': (3.05, 5),
+    'api.search.brave.com': (3.05, 5),
+}
+
+# Quota-limited APIs: a 429 means the quota is gone, so retrying only burns
+# more of it. These hosts are retried on 5xx only.
+QUOTA_LIMITED_HOSTS = ('api.unsplash.com', 'api.pexels.com', 'pixabay.com', 'api.search.brave.com')
+
+HTTP_RETRY_TOTAL = int(os.getenv('HTTP_RETRY_TOTAL', 3))
+HTTP_RETRY_BACKOFF = float(os.getenv('HTTP_RETRY_BACKOFF', 0.3))
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', 16))
+# Hosts outside HOST_TIMEOUTS (Brave results, downloaded images) share one
+# session labelled OTHER_HOST, keeping connection pools for this many of
+# them (least recently used are closed)
+OTHER_HOST = 'other'
+HTTP_OTHER_POOLS = int(os.getenv('HTTP_OTHER_POOLS', 32))
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf'))
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_latency = {}
+_latency_lock = threading.Lock()
+
+
+def _build_session(host):
+    status_forcelist = (500, 502, 503, 504)
+    if not _matches(host, QUOTA_LIMITED_HOSTS):
+        status_forcelist = (429,) + status_forcelist
+    # PATCH is safe to retry here: every PATCH we send sets absolute values.
+    # POST is left out so a retried insert can never create duplicate rows.
+    # Retry-After is ignored because providers send values up to an hour;
+    # jittered exponential backoff is used instead.
+    retry = Retry(
+        total=HTTP_RETRY_TOTAL,
+        backoff_factor=HTTP_RETRY_BACKOFF,
+        backoff_jitter=HTTP_RETRY_BACKOFF,
+        status_forcelist=status_forcelist,
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS | {'PATCH'},
+        respect_retry_after_header=False,
+        raise_on_status=False,
+    )
+    pool_connections = HTTP_OTHER_POOLS if host == OTHER_HOST else 1
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_connections, pool_maxsize=HTTP_POOL_MAXSIZE)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def pool_key(host):
+    """
+    Return the host itself for the APIs in HOST_TIMEOUTS, else OTHER_HOST,
+    so sessions and latency histograms stay bounded however many sites
+    images come from.
+    """
+    return host if _matches(host, tuple(HOST_TIMEOUTS)) else OTHER_HOST
+
+def get_session(host):
+    """Return the keep-alive session for a host, creating it on first use."""
+    host = pool_key(host)
+    session = _sessions.get(host)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(host)
+            if session is None:
+                session = _sessions[host] = _build_session(host)
+    return session
+
+def _matches(host, suffixes):
+    return any(host == suffix or host.endswith('.' + suffix) for suffix in suffixes)
+
+def _timeout_for(host):
+    for suffix, timeout in HOST_TIMEOUTS.items():
+        if _matches(host, (suffix,)):
+            return timeout
+    return DEFAULT_TIMEOUT
+
+def _record_latency(host, seconds):
+    with _latency_lock:
+        stats = _latency.get(host)
+        if stats is None:
+            stats = _latency[host] = {'count': 0, 'sum': 0.0, 'buckets': [0] * len(LATENCY_BUCKETS)}
+        stats['count'] += 1
+        stats['sum'] += seconds
+        stats['buckets'][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+def request(method, url, timeout=None, **kwargs):
+    """
+    Send a request through the pooled session for the URL's host.
+
+    Args:
+        method (str): HTTP method
+        url (str): Full URL
+        timeout (tuple, optional): (connect, read) timeout; defaults per host
+        **kwargs: Passed through to requests (headers, params, json, stream...)
+
+    Returns:
+        requests.Response
+    """
+    host = urlsplit(url).hostname or ''
+    if timeout is None:
+        timeout = _timeout_for(host)
+
+    started = time.perf_counter()
+    try:
+        return get_session(host).request(method, url, timeout=timeout, **kwargs)
+    finally:
+        _record_latency(pool_key(host), time.perf_counter() - started)
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+def patch(url, **kwargs):
+    return request('PATCH', url, **kwargs)
+
+def latency_stats():
+    """
+    Return per-host latency histograms; hosts outside HOST_TIMEOUTS are
+    merged under OTHER_HOST.
+
+    Returns:
+        dict: host -> {'count', 'sum', 'buckets': {upper_bound: count}}
+    """
+    with _latency_lock:
+        return {
+            host: {
+                'count': stats['count'],
+                'sum': stats['sum'],
+                'buckets': dict(zip(LATENCY_BUCKETS, stats['buckets'])),
+            }
+            for host, stats in _latency.items()
+        }
@@ -1,20 +1,115 @@
-import requests
+import http_client
 import os
+from concurrent.futures import ThreadPoolExecutor, wait
+import math
+import sqlite3
+
+from cache import Cache
+from image_hash import dhash, hash_index, IMAGE_DUP_DISTANCE
+from image_processing import download_image
+import instrumentation
+from instrumentation import span
+from provider_cache import response_cache, limiters
 
 BRAVE_API_KEY = os.getenv('BRAVE_API_KEY')
 UNSPLASH_ACCESS_KEY = os.getenv('UNSPLASH_API_KEY')
 PIXABAY_API_KEY = os.getenv('PIXABAY_API_KEY')
 PEXELS_API_KEY = os.getenv('PEXELS_API_KEY')
 
-def get_brave_image(word):
+# Per-call timeout for provider APIs: (connect, read) in seconds
+PROVIDER_TIMEOUT = (3.05, float(os.getenv('PROVIDER_READ_TIMEOUT', 5)))
+# Overall budget for one image search across all providers
+IMAGE_SEARCH_DEADLINE = float(os.getenv('IMAGE_SEARCH_DEADLINE', 4))
+# Comma-separated provider priority, best first
+IMAGE_PROVIDER_ORDER = os.getenv('IMAGE_PROVIDER_ORDER', 'unsplash,pexels,pixabay,brave').split(',')
+# Query parameters that carry credentials
+SECRET_PARAMS = ('client_id', 'key')
+# Candidates bigger than this are not downloaded just to be hashed
+CANDIDATE_HASH_MAX_BYTES = 5 * 1024 * 1024
+# Ranked candidates are kept per word so alternates cost no API calls
+CANDIDATE_CACHE_TTL = int(os.getenv('CANDIDATE_CACHE_TTL', 24 * 3600))
+
+# Weights of the shared scoring scale; every feature is in [0, 1]
+SCORE_WEIGHTS = {
+    'match': 0.5,       # search term appears in the title/description/tags
+    'popularity': 0.2,  # likes/views/downloads, normalised within each provider
+    'resolution': 0.15, # megapixels, capped at 3
+    'priority': 0.15,   # position in IMAGE_PROVIDER_ORDER
+}
+
+def _provider_get(provider, url, params, headers=None):
     """
-    Fetch the most relevant image from Brave Search.
+    GET a provider API through the on-disk response cache and the
+    provider's quota limiter.
+    
+    A provider that is out of quota is skipped at once rather than waited
+    on; cached responses are still served for it.
+    
+    Returns:
+        dict: Parsed JSON, or None if the call failed or was skipped
+    """
+    # API keys are not part of the cache key
+    key = response_cache.make_key(provider, url, {k: v for k, v in params.items() if k not in SECRET_PARAMS})
+    try:
+        cached = response_cache.get(key)
+    except sqlite3.Error as e:
+        print(f"Provider cache read failed: {e}")
+        cached = None
+    if cached is not None:
+        return cached
+    
+    limiter = limiters.get(provider)
+    if limiter and not limiter.try_acquire():
+        instrumentation.log('provider_skipped', provider=provider, reason='quota')
+        return None
+    
+    with span(f'provider.{provider}'):
+        response = http_client.get(url, headers=headers, params=params, timeout=PROVIDER_TIMEOUT)
+    if limiter:
+        limiter.update_from_response(response)
+    if response.status_code != 200:
+        return None
+    
+    data = response.json()
+    try:
+        response_cache.set(key, provider, data)
+    except sqlite3.Error as e:
+        print(f"Provider cache write failed: {e}")
+    return data
+
+def provider_status():
+    """Return whether each provider can be called right now."""
+    return {name: limiter.available() for name, limiter in limiters.items()}
+
+def _candidate(source, url, thumb_url, width, height, text, popularity):
+    """
+    Normalised search result shared by all providers.
+    
+    `text` is searched for the query word and `popularity` is the
+    provider's own engagement number; both are turned into features on
+    the common scale by rank_candidates.
+    """
+    return {
+        'url': url,
+        'thumb_url': thumb_url or url,
+        'width': width or 0,
+        'height': height or 0,
+        'source': source,
+        'text': (text or '').lower(),
+        'popularity': popularity or 0,
+        'score': 0.0,
+    }
+
+def search_brave(word, max_results=10):
+    """
+    Search Brave for images.
     
     Args:
         word (str): Search term
+        max_results (int, optional): Number of results to request
         
     Returns:
-        str: URL of the most relevant image
+        list: Candidates, unranked
     """
     url = 'https://api.search.brave.com/res/v1/images/search'
 
@@ -25,19 +120,33 @@ def get_brave_image(word):
 
     params = {
         'q': word,
-        'count': 1,  # number of images
+        'count': max_results,  # number of images
     }
     
-    response = requests.get(url, headers=headers, params=params)
-    # print(response.status_code)
-    if response.status_code == 200:# and len(data['results']) > 0:
-        data = response.json()
-        return data['results'][0]['properties']['url']
-    return None
+    data = _provider_get('brave', url, params, headers=headers)
+    if data is None:
+        return []
+    
+    candidates = []
+    for result in data.get('results', []):
+        properties = result.get('properties') or {}
+        if not properties.get('url'):
+            continue
+        candidates.append(_candidate(
+            'brave', properties['url'], (result.get('thumbnail') or {}).get('src'),
+            properties.get('width'), properties.get('height'),
+            result.get('title'), 0
+        ))
+    return candidates
 
-def get_pexels_image(word, orientation=None, color=None, max_results=10):
+def _pexels_src(photo):
+    # 'original' can be 20+ MB; large2x (max 1880px wide) is plenty for an
+    # 800px upload and for display
+    return photo['src'].get('large2x') or photo['src']['original']
+
+def search_pexels(word, orientation=None, color=None, max_results=10):
     """
-    Fetch images from Pexels with improved relevance.
+    Search Pexels for images.
     
     Args:
         word (str): Search term
@@ -46,7 +155,7 @@ def get_pexels_image(word, orientation=None, color=None, max_results=10):
         max_results (int, optional): Maximum number of results to consider
         
     Returns:
-        str: URL of the most relevant image
+        list: Candidates, unranked
     """
     headers = {'Authorization': PEXELS_API_KEY}
     params = {
@@ -62,50 +171,22 @@ def get_pexels_image(word, orientation=None, color=None, max_results=10):
     if color:
         params['color'] = color
         
-    response = requests.get('https://api.pexels.com/v1/search', headers=headers, params=params)
-    data = response.json()
-    
-    if not data.get('photos'):
-        return None
-        
-    photos = data['photos']
+    data = _provider_get('pexels', 'https://api.pexels.com/v1/search', params, headers=headers)
+    if data is None:
+        return []
     
-    if not photos:
-        return None
-        
-    # If we have multiple results, try to find the most relevant one
-    if len(photos) > 1:
-        # Score images based on relevance factors
-        scored_photos = []
-        
-        for photo in photos:
-            score = 0
-            
-            # Images with the search term in their title/description are more relevant
-            if word.lower() in photo.get('alt', '').lower():
-                score += 5
-                
-            # Photographer-selected images might be higher quality
-            if photo.get('photographer'):
-                score += 1
-                
-            # Prefer images with higher width/quality
-            score += min(photo.get('width', 0) / 1000, 3)
-            
-            scored_photos.append((score, photo))
-            
-        # Sort by score (highest first)
-        scored_photos.sort(reverse=True, key=lambda x: x[0])
-        best_photo = scored_photos[0][1]
-        
-        return best_photo['src']['original']
-    else:
-        # If only one result, return it
-        return photos[0]['src']['original']
+    # Pexels exposes no engagement numbers; its result order is the signal
+    photos = data.get('photos') or []
+    return [
+        _candidate('pexels', _pexels_src(photo), photo['src'].get('medium'),
+                   photo.get('width'), photo.get('height'), photo.get('alt'),
+                   len(photos) - position)
+        for position, photo in enumerate(photos)
+    ]
 
-def get_unsplash_image(word, orientation=None, color=None, max_results=30):
+def search_unsplash(word, orientation=None, color=None, max_results=30):
     """
-    Fetch the most relevant image from Unsplash.
+    Search Unsplash for images.
     
     Args:
         word (str): Search term
@@ -114,7 +195,7 @@ def get_unsplash_image(word, orientation=None, color=None, max_results=30):
         max_results (int, optional): Maximum number of results to consider
         
     Returns:
-        str: URL of the most relevant image
+        list: Candidates, unranked
     """
     params = {
         'query': word,
@@ -131,60 +212,25 @@ def get_unsplash_image(word, orientation=None, color=None, max_results=30):
     if color:
         params['color'] = color
     
-    r = requests.get("https://api.unsplash.com/search/photos", params=params)
-    if r.status_code != 200:
-        return None
-    
-    data = r.json()
-    results = data.get('results', [])
+    data = _provider_get('unsplash', "https://api.unsplash.com/search/photos", params)
+    if data is None:
+        return []
     
-    if not results:
-        return None
-    
-    # Score images based on relevance criteria
-    scored_results = []
-    for img in results:
-        score = 0
-        
-        # Check if search term appears in description or alt text - safely handle None values
-        description = img.get('description', '') or ''
-        if description:  # Only call lower() if description exists and is not None
-            description = description.lower()
-            
-        alt = img.get('alt_description', '') or ''
-        if alt:  # Only call lower() if alt exists and is not None
-            alt = alt.lower()
-            
-        if word.lower() in description or word.lower() in alt:
-            score += 10
-        
-        # Higher likes/downloads suggest better quality/relevance
-        score += min(img.get('likes', 0) / 50, 5)  # Cap at 5 points
-        
-        # Better resolution images may be more useful
-        width = img.get('width', 0)
-        height = img.get('height', 0)
-        score += min((width * height) / 1000000, 3)  # Cap at 3 points
-        
-        # Check for tags that match the query
-        tags = img.get('tags', [])
-        for tag in tags:
-            tag_title = tag.get('title', '') or ''
-            if tag_title and word.lower() in tag_title.lower():
-                score += 5
-                break
-        
-        scored_results.append((score, img))
-    
-    # Sort by score (highest first)
-    scored_results.sort(reverse=True, key=lambda x: x[0])
-    
-    # Return the URL of the highest-scoring image (regular size for better quality than small)
-    return scored_results[0][1]['urls']['regular'] if scored_results else None
+    candidates = []
+    for img in data.get('results', []):
+        # description and alt_description may be None
+        tags = ' '.join(tag.get('title') or '' for tag in img.get('tags', []))
+        text = ' '.join([img.get('description') or '', img.get('alt_description') or '', tags])
+        # regular size for better quality than small
+        candidates.append(_candidate(
+            'unsplash', img['urls']['regular'], img['urls'].get('small'),
+            img.get('width'), img.get('height'), text, img.get('likes', 0)
+        ))
+    return candidates
 
-def get_pixabay_image(word, orientation=None, color=None, max_results=30):
+def search_pixabay(word, orientation=None, color=None, max_results=30):
     """
-    Fetch the most relevant image from Pixabay.
+    Search Pixabay for images.
     
     Args:
         word (str): Search term
@@ -193,7 +239,7 @@ def get_pixabay_image(word, orientation=None, color=None, max_results=30):
         max_results (int, optional): Maximum number of results to consider
         
     Returns:
-        str: URL of the most relevant image
+        list: Candidates, unranked
     """
     params = {
         'key': PIXABAY_API_KEY,
@@ -212,43 +258,239 @@ def get_pixabay_image(word, orientation=None, color=None, max_results=30):
     if color:
         params['colors'] = color
     
-    response = requests.get("https://pixabay.com/api/", params=params)
-    if response.status_code != 200:
-        return None
+    data = _provider_get('pixabay', "https://pixabay.com/api/", params)
+    if data is None:
+        return []
     
-    data = response.json()
-    hits = data.get('hits', [])
+    return [
+        _candidate('pixabay', img['largeImageURL'], img.get('webformatURL'),
+                   img.get('imageWidth'), img.get('imageHeight'), img.get('tags'),
+                   img.get('views', 0) / 100 + img.get('downloads', 0) / 20 + img.get('likes', 0))
+        for img in data.get('hits', [])
+    ]
+
+def rank_candidates(candidates, word=None, providers=None):
+    """
+    Score candidates from any mix of providers on one scale and sort them.
     
-    if not hits:
-        return None
+    Each feature is computed as a column over all candidates and scaled to
+    [0, 1]; popularity is log-scaled and normalised per provider, since
+    Unsplash likes and Pixabay views are not comparable.
+    
+    Args:
+        candidates (list): Candidates from the search_* functions
+        word (str, optional): Search term for the text match feature
+        providers (list, optional): Provider priority order
+        
+    Returns:
+        list: The same candidates, with 'score' set, best first
+    """
+    if not candidates:
+        return []
+    order = [name.strip() for name in (providers or IMAGE_PROVIDER_ORDER)]
+    word = (word or '').lower()
+    
+    match = [1.0 if word and word in c['text'] else 0.0 for c in candidates]
+    
+    log_popularity = [math.log1p(max(c['popularity'], 0)) for c in candidates]
+    provider_max = {}
+    for c, value in zip(candidates, log_popularity):
+        provider_max[c['source']] = max(provider_max.get(c['source'], 0.0), value)
+    popularity = [value / provider_max[c['source']] if provider_max[c['source']] else 0.0
+                  for c, value in zip(candidates, log_popularity)]
+    
+    resolution = [min(c['width'] * c['height'] / 3_000_000, 1.0) for c in candidates]
+    
+    priority = [(len(order) - order.index(c['source'])) / len(order) if c['source'] in order else 0.0
+                for c in candidates]
+    
+    for i, c in enumerate(candidates):
+        c['score'] = round(SCORE_WEIGHTS['match'] * match[i]
+                           + SCORE_WEIGHTS['popularity'] * popularity[i]
+                           + SCORE_WEIGHTS['resolution'] * resolution[i]
+                           + SCORE_WEIGHTS['priority'] * priority[i], 4)
+    return sorted(candidates, key=lambda c: c['score'], reverse=True)
+
+def _best_url(candidates, word):
+    ranked = rank_candidates(candidates, word)
+    return ranked[0]['url'] if ranked else None
+
+def get_brave_image(word):
+    """
+    Fetch the most relevant image from Brave Search.
     
-    # Score images based on relevance criteria
-    scored_hits = []
-    word_lower = word.lower()
+    Args:
+        word (str): Search term
+        
+    Returns:
+        str: URL of the most relevant image
+    """
+    return _best_url(search_brave(word), word)
+
+def get_pexels_image(word, orientation=None, color=None, max_results=10):
+    """
+    Fetch images from Pexels with improved relevance.
     
-    for img in hits:
-        score = 0
+    Args:
+        word (str): Search term
+        orientation (str, optional): 'landscape', 'portrait', or 'square'
+        color (str, optional): Color to filter by (e.g., 'red', 'blue')
+        max_results (int, optional): Maximum number of results to consider
         
-        # Check if tags match the search term
-        tags = img.get('tags', '').lower()
-        if word_lower in tags:
-            score += 10
+    Returns:
+        str: URL of the most relevant image
+    """
+    return _best_url(search_pexels(word, orientation, color, max_results), word)
+
+def get_unsplash_image(word, orientation=None, color=None, max_results=30):
+    """
+    Fetch the most relevant image from Unsplash.
+    
+    Args:
+        word (str): Search term
+        orientation (str, optional): 'landscape', 'portrait', or 'square'
+        color (str, optional): Color filter (e.g., 'black', 'blue')
+        max_results (int, optional): Maximum number of results to consider
         
-        # Higher popularity metrics suggest better quality/relevance
-        score += min(img.get('views', 0) / 1000, 5)  # Cap at 5 points
-        score += min(img.get('downloads', 0) / 200, 5)  # Cap at 5 points
-        score += min(img.get('likes', 0) / 100, 3)  # Cap at 3 points
+    Returns:
+        str: URL of the most relevant image
+    """
+    return _best_url(search_unsplash(word, orientation, color, max_results), word)
+
+def get_pixabay_image(word, orientation=None, color=None, max_results=30):
+    """
+    Fetch the most relevant image from Pixabay.
+    
+    Args:
+        word (str): Search term
+        orientation (str, optional): 'landscape', 'portrait'
+        color (str, optional): Color filter (e.g., 'red', 'blue')
+        max_results (int, optional): Maximum number of results to consider
         
-        # Better resolution images may be more useful
-        resolution = img.get('imageWidth', 0) * img.get('imageHeight', 0)
-        score += min(resolution / 1000000, 3)  # Cap at 3 points
+    Returns:
+        str: URL of the most relevant image
+    """
+    return _best_url(search_pixabay(word, orientation, color, max_results), word)
+
+
+IMAGE_PROVIDERS = {
+    'unsplash': search_unsplash,
+    'pexels': search_pexels,
+    'pixabay': search_pixabay,
+    'brave': search_brave,
+}
+
+_search_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='image-search')
+_candidate_cache = Cache('candidates', maxsize=4096, ttl=CANDIDATE_CACHE_TTL)
+
+def _safe_call(provider_func, word):
+    try:
+        return provider_func(word)
+    except Exception as e:
+        print(f"{provider_func.__name__} failed for {word}: {e}")
+        return []
+
+def search_candidates(word, providers=None, deadline=IMAGE_SEARCH_DEADLINE):
+    """
+    Query all image providers concurrently and rank every result together.
+    
+    Waits for all providers until the deadline; those that have not
+    answered by then are ignored and their threads finish in the
+    background.
+    
+    Args:
+        word (str): Search term
+        providers (list, optional): Provider names in priority order,
+            defaults to IMAGE_PROVIDER_ORDER
+        deadline (float, optional): Seconds to wait for providers
         
-        scored_hits.append((score, img))
+    Returns:
+        list: Candidate dicts (url, thumb_url, width, height, source,
+            score), best first
+    """
+    names = [name.strip() for name in (providers or IMAGE_PROVIDER_ORDER)
+             if name.strip() in IMAGE_PROVIDERS]
+    futures = [_search_executor.submit(_safe_call, IMAGE_PROVIDERS[name], word) for name in names]
     
-    # Sort by score (highest first)
-    scored_hits.sort(reverse=True, key=lambda x: x[0])
+    with span('image_search'):
+        done, not_done = wait(futures, timeout=deadline)
+    for future in not_done:
+        future.cancel()
     
-    # Return the URL of the highest-scoring image
-    return scored_hits[0][1]['largeImageURL'] if scored_hits else None
+    candidates = []
+    seen = set()
+    for future in futures:
+        if future in done:
+            for candidate in future.result():
+                if candidate['url'] not in seen:
+                    seen.add(candidate['url'])
+                    candidates.append(candidate)
+    return rank_candidates(candidates, word, names)
+
+def get_candidates(word, providers=None, deadline=IMAGE_SEARCH_DEADLINE):
+    """
+    search_candidates, cached per word for CANDIDATE_CACHE_TTL in the
+    shared cache, so concurrent requests for a word (in any worker) run one
+    search. Empty results are not cached so a provider outage is retried.
+    """
+    return _candidate_cache.get_or_set(
+        word.lower(),
+        lambda: search_candidates(word, providers=providers, deadline=deadline),
+        cache_if=bool
+    )
+
+def search_images(word, providers=None, deadline=IMAGE_SEARCH_DEADLINE):
+    """
+    Returns:
+        list: Image URLs, best first
+    """
+    return [c['url'] for c in get_candidates(word, providers=providers, deadline=deadline)]
 
+def search_image(word, providers=None, deadline=IMAGE_SEARCH_DEADLINE):
+    """
+    Return the best image URL found within the deadline, or None.
+    """
+    urls = search_images(word, providers=providers, deadline=deadline)
+    return urls[0] if urls else None
 
+_candidate_hashes = Cache('candidate_hashes', maxsize=2048, ttl=CANDIDATE_CACHE_TTL)
+
+def _hash_url(url):
+    try:
+        return dhash(download_image(url, max_bytes=CANDIDATE_HASH_MAX_BYTES))
+    except Exception as e:
+        print(f"Could not hash candidate {url}: {e}")
+        return None
+
+def _candidate_hash(url):
+    # A failed download is retried next time rather than cached for a day
+    return _candidate_hashes.get_or_set(url, lambda: _hash_url(url),
+                                        cache_if=lambda value: value is not None)
+
+def demote_stored_images(candidates, max_distance=IMAGE_DUP_DISTANCE, limit=None):
+    """
+    Move candidates that look like an image we already store to the end,
+    keeping the relative order within each group.
+    
+    Downloads each candidate's thumbnail once to hash it, so call it off
+    the request path (the prefetch workers do).
+    
+    Args:
+        candidates (list): Candidate dicts, best first
+        max_distance (int, optional): Hamming radius for a match
+        limit (int, optional): Only check the first `limit` candidates
+        
+    Returns:
+        list: Reordered candidates
+    """
+    if len(hash_index) == 0:
+        return list(candidates)
+    checked = candidates[:limit] if limit else candidates
+    hashes = list(_search_executor.map(_candidate_hash, [c['thumb_url'] for c in checked]))
+    fresh, stored = [], []
+    for candidate, value in zip(checked, hashes):
+        if value is not None and hash_index.find_near(value, max_distance):
+            stored.append(candidate)
+        else:
+            fresh.append(candidate)
+    return fresh + stored + list(candidates[len(checked):])
@@ -0,0 +1,204 @@
+import os
+import re
+import sqlite3
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+IMAGE_HASH_INDEX_PATH = os.getenv('IMAGE_HASH_INDEX_PATH', 'image_hashes.sqlite3')
+# Hashes within this many differing bits (out of 64) count as the same picture
+IMAGE_DUP_DISTANCE = int(os.getenv('IMAGE_DUP_DISTANCE', 6))
+HASH_SIZE = 8
+
+# Derivative keys end in '-{size}.{ext}'; only main images are indexed
+DERIVATIVE_KEY = re.compile(r'-\d+\.\w+$')
+
+
+def dhash(img_data, hash_size=HASH_SIZE):
+    """
+    Difference hash of an image: compare neighbouring pixels of a
+    (hash_size + 1) x hash_size greyscale thumbnail.
+
+    Args:
+        img_data (bytes or PIL.Image): Image to hash
+
+    Returns:
+        int: 64-bit hash for the default hash_size
+    """
+    from PIL import Image
+    img = img_data
+    if isinstance(img_data, (bytes, bytearray)):
+        img = Image.open(BytesIO(img_data))
+        img.draft('L', (hash_size * 8, hash_size * 8))
+    img = img.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    pixels = img.tobytes()
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over hamming distance.
+
+    A lookup within radius r only descends into children whose edge
+    distance d satisfies |d - dist(query, node)| <= r, which skips most of
+    the tree for small radii.
+    """
+
+    def __init__(self):
+        self.root = None  # [hash, keys, {distance: child}]
+        self.size = 0
+
+    def add(self, value, key):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [key], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(key)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [key], {}]
+                return
+            node = child
+
+    def search(self, value, radius):
+        """
+        Returns:
+            list: (distance, key) pairs within radius, nearest first
+        """
+        if self.root is None:
+            return []
+        found = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= radius:
+                found.extend((distance, key) for key in node[1])
+            for edge, child in node[2].items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+        found.sort()
+        return found
+
+
+def _to_signed(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def _to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+class ImageHashIndex:
+    """
+    Perceptual hashes of every stored image.
+
+    The SQLite file is the shared record; each process keeps a BK-tree in
+    memory and pulls rows added by other workers (by rowid) before every
+    lookup.
+    """
+
+    def __init__(self, path=IMAGE_HASH_INDEX_PATH):
+        self.path = path
+        self._tree = BKTree()
+        self._last_rowid = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS image_hashes (s3_key TEXT PRIMARY KEY, hash INTEGER NOT NULL)")
+            self._local.conn = conn
+        return conn
+
+    def _refresh(self):
+        rows = self._connect().execute(
+            "SELECT rowid, s3_key, hash FROM image_hashes WHERE rowid > ? ORDER BY rowid",
+            (self._last_rowid,),
+        ).fetchall()
+        for rowid, s3_key, value in rows:
+            self._tree.add(_to_unsigned(value), s3_key)
+            self._last_rowid = rowid
+
+    def add(self, s3_key, value):
+        with self._lock:
+            self._connect().execute("INSERT OR IGNORE INTO image_hashes (s3_key, hash) VALUES (?, ?)",
+                                    (s3_key, _to_signed(value)))
+            self._refresh()
+
+    def contains(self, s3_key):
+        return self._connect().execute("SELECT 1 FROM image_hashes WHERE s3_key = ?", (s3_key,)).fetchone() is not None
+
+    def find_near(self, value, max_distance=IMAGE_DUP_DISTANCE):
+        """
+        Returns:
+            list: (distance, s3_key) pairs, nearest first
+        """
+        with self._lock:
+            self._refresh()
+            return self._tree.search(value, max_distance)
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return self._tree.size
+
+
+hash_index = ImageHashIndex()
+
+
+def build_index_from_s3(workers=8):
+    """
+    Hash every main image already in the bucket that is not indexed yet.
+    Prefers the 200px derivative when one exists, to download less.
+
+    Returns:
+        int: Number of images added
+    """
+    from storage import get_s3_client, S3_BUCKET
+
+    s3 = get_s3_client()
+    keys = set()
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=S3_BUCKET):
+        keys.update(obj['Key'] for obj in page.get('Contents', []))
+
+    def index_one(s3_key):
+        small = s3_key[:-len('.jpeg')] + '-200.jpeg'
+        source = small if small in keys else s3_key
+        body = s3.get_object(Bucket=S3_BUCKET, Key=source)['Body'].read()
+        hash_index.add(s3_key, dhash(body))
+
+    todo = [key for key in keys if not DERIVATIVE_KEY.search(key) and not hash_index.contains(key)]
+    added = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for future in [pool.submit(index_one, key) for key in todo]:
+            try:
+                future.result()
+                added += 1
+            except Exception as e:
+                print(f"Could not hash image: {e}")
+    return added
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['build']:
+        print(f"Indexed {build_index_from_s3()} images, {len(hash_index)} total")
+    else:
+        print("usage: python image_hash.py build")
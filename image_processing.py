@@ -0,0 +1,194 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+import http_client
+from instrumentation import span
+
+# Refuse downloads larger than this many bytes
+IMAGE_MAX_BYTES = int(os.getenv('IMAGE_MAX_BYTES', 25 * 1024 * 1024))
+IMAGE_MAX_SIZE = 800
+IMAGE_JPEG_QUALITY = 85
+# Worker processes for decoding/resizing; 0 runs in the calling thread
+IMAGE_PROCESS_WORKERS = int(os.getenv('IMAGE_PROCESS_WORKERS', 2))
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Derivatives produced for every accepted image, largest first
+IMAGE_DERIVATIVE_SIZES = sorted(
+    (int(size) for size in os.getenv('IMAGE_DERIVATIVE_SIZES', '200,400,800').split(',')),
+    reverse=True
+)
+IMAGE_DERIVATIVE_FORMATS = os.getenv('IMAGE_DERIVATIVE_FORMATS', 'jpeg,webp').split(',')
+# AVIF needs a Pillow build with libavif (or pillow-avif-plugin) and is slow
+# to encode, so it is opt-in
+if os.getenv('IMAGE_AVIF', '0') == '1':
+    from PIL import Image
+    try:
+        import pillow_avif  # noqa: F401, registers the AVIF plugin
+    except ImportError:
+        pass
+    # Image.SAVE only lists the preinit plugins until init() loads the rest
+    Image.init()
+    if 'AVIF' in Image.SAVE:
+        IMAGE_DERIVATIVE_FORMATS.append('avif')
+    else:
+        print("IMAGE_AVIF=1 but this Pillow build cannot write AVIF; skipping AVIF derivatives")
+
+FORMAT_OPTIONS = {
+    'jpeg': {'format': 'JPEG', 'quality': IMAGE_JPEG_QUALITY, 'optimize': True, 'progressive': True},
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'avif': {'format': 'AVIF', 'quality': 60},
+}
+CONTENT_TYPES = {'jpeg': 'image/jpeg', 'webp': 'image/webp', 'avif': 'image/avif'}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class ImageTooLarge(Exception):
+    pass
+
+
+def download_image(image_url, max_bytes=IMAGE_MAX_BYTES):
+    """
+    Stream an image into memory, stopping once it exceeds max_bytes.
+
+    Returns:
+        bytes: The image file
+    """
+    with span('image.download'):
+        return _download(image_url, max_bytes)
+
+def _download(image_url, max_bytes):
+    response = http_client.get(image_url, stream=True)
+    try:
+        response.raise_for_status()
+        length = response.headers.get('Content-Length')
+        if length and length.isdigit() and int(length) > max_bytes:
+            raise ImageTooLarge(f"{image_url} is {length} bytes, limit is {max_bytes}")
+
+        buffer = BytesIO()
+        for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+            buffer.write(chunk)
+            if buffer.tell() > max_bytes:
+                raise ImageTooLarge(f"{image_url} exceeds {max_bytes} bytes")
+        return buffer.getvalue()
+    finally:
+        response.close()
+
+def to_rgb(img):
+    """Convert any mode to RGB, flattening transparency onto white."""
+    from PIL import Image
+    if img.mode == 'P':
+        img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+    if img.mode in ('RGBA', 'LA'):
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        return background
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+def open_reduced(img_data, max_size=IMAGE_MAX_SIZE):
+    """
+    Decode an image at the smallest scale that still covers max_size.
+
+    For JPEGs, draft() lets libjpeg decode at 1/2, 1/4 or 1/8 scale, so a
+    6000px original never exists in memory at full resolution. EXIF
+    orientation is applied so the result is upright.
+    """
+    # Pillow is imported on first use, not at app startup
+    from PIL import Image, ImageOps
+    img = Image.open(BytesIO(img_data))
+    img.draft('RGB', (max_size, max_size))
+    img = ImageOps.exif_transpose(img)
+    return to_rgb(img)
+
+def process_image(img_data, max_size=IMAGE_MAX_SIZE, quality=IMAGE_JPEG_QUALITY):
+    """
+    Resize raw image bytes to fit in max_size pixels and encode as JPEG.
+
+    Returns:
+        bytes: The encoded JPEG
+    """
+    img = open_reduced(img_data, max_size)
+    img.thumbnail((max_size, max_size))
+
+    buffer = BytesIO()
+    img.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+def process_derivatives(img_data, sizes=None, formats=None):
+    """
+    Produce every size/format combination from a single decode.
+
+    Each size is downscaled from the next larger one rather than from the
+    original, so the full image is resampled only once.
+
+    Returns:
+        dict: '{size}.{ext}' -> encoded bytes, e.g. '400.webp'
+    """
+    sizes = sorted(sizes or IMAGE_DERIVATIVE_SIZES, reverse=True)
+    formats = formats or IMAGE_DERIVATIVE_FORMATS
+
+    img = open_reduced(img_data, sizes[0])
+    derivatives = {}
+    for size in sizes:
+        img.thumbnail((size, size))
+        for fmt in formats:
+            buffer = BytesIO()
+            img.save(buffer, **FORMAT_OPTIONS[fmt])
+            derivatives[f'{size}.{fmt}'] = buffer.getvalue()
+    return derivatives
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn, not fork: gunicorn workers run threads, and forking
+                # a threaded process can copy held locks into the child
+                _pool = ProcessPoolExecutor(max_workers=IMAGE_PROCESS_WORKERS,
+                                            mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+def _reset_pool(broken):
+    """Drop a pool whose child died, unless another thread already replaced it."""
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False)
+
+def _run_in_pool(func, *args):
+    """
+    Run func in the worker process pool. If a child crashed or was killed,
+    the pool is broken for good, so replace it and retry once.
+    """
+    pool = _get_pool()
+    try:
+        return pool.submit(func, *args).result()
+    except BrokenProcessPool:
+        print("Image process pool broke, restarting it")
+        _reset_pool(pool)
+        return _get_pool().submit(func, *args).result()
+
+def process_image_offloaded(img_data, max_size=IMAGE_MAX_SIZE, quality=IMAGE_JPEG_QUALITY):
+    """
+    Run process_image in the worker process pool so decoding and resizing
+    do not hold the GIL of the web worker.
+    """
+    with span('image.resize'):
+        if IMAGE_PROCESS_WORKERS <= 0:
+            return process_image(img_data, max_size, quality)
+        return _run_in_pool(process_image, img_data, max_size, quality)
+
+def process_derivatives_offloaded(img_data, sizes=None, formats=None):
+    """process_derivatives, run in the worker process pool."""
+    with span('image.resize'):
+        if IMAGE_PROCESS_WORKERS <= 0:
+            return process_derivatives(img_data, sizes, formats)
+        return _run_in_pool(process_derivatives, img_data, sizes, formats)
@@ -0,0 +1,164 @@
+import json
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, request
+
+# Fraction of structured log events that are printed
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', 0.1))
+
+# Upper bounds of the histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf'))
+
+
+class Histogram:
+    """Cumulative latency histograms keyed by a tuple of label values."""
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, seconds):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {'count': 0, 'sum': 0.0, 'buckets': [0] * len(BUCKETS)}
+            series['count'] += 1
+            series['sum'] += seconds
+            series['buckets'][bisect_left(BUCKETS, seconds)] += 1
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: labels -> {'count', 'sum', 'buckets'}, copied
+        """
+        with self._lock:
+            return {labels: dict(s, buckets=list(s['buckets'])) for labels, s in self._series.items()}
+
+    def render(self):
+        """Prometheus text exposition of every series."""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, s in sorted(self.snapshot().items()):
+            label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip(BUCKETS, s['buckets']):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                lines.append(f'{self.name}_bucket{{{label_text},le="{le}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {s["sum"]}')
+            lines.append(f'{self.name}_count{{{label_text}}} {s["count"]}')
+        return '\n'.join(lines)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+request_seconds = Histogram('app_request_duration_seconds', 'Time to handle a request',
+                            ('endpoint', 'method', 'status'))
+span_seconds = Histogram('app_span_duration_seconds', 'Time spent in external calls and image processing',
+                         ('span',))
+
+
+@contextmanager
+def span(name):
+    """
+    Time a block, e.g. `with span('supabase.word-list'):`.
+
+    Every span feeds the app_span_duration_seconds histogram. Spans on the
+    request thread are also reported in that response's Server-Timing
+    header; spans in worker threads are only counted in the histogram.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        span_seconds.observe((name,), elapsed)
+        if has_request_context() and 'spans' in g:
+            g.spans.append((name, elapsed))
+
+def log(event, sample=None, **fields):
+    """
+    Print a one-line JSON event, for a sampled fraction of calls.
+
+    Args:
+        event (str): Event name
+        sample (float, optional): Probability of printing; LOG_SAMPLE_RATE by default
+        **fields: Values to include
+    """
+    if random.random() >= (LOG_SAMPLE_RATE if sample is None else sample):
+        return
+    print(json.dumps({'event': event, 'ts': round(time.time(), 3), **fields}, default=str))
+
+def server_timing(spans, total):
+    """Format spans as a Server-Timing header, one entry per span name."""
+    totals = {}
+    for name, elapsed in spans:
+        count, summed = totals.get(name, (0, 0.0))
+        totals[name] = (count + 1, summed + elapsed)
+    entries = [f'{name};dur={summed * 1000:.1f};desc="{count}x"' for name, (count, summed) in totals.items()]
+    entries.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(entries)
+
+def render_metrics():
+    """All metrics in Prometheus text format, including http_client per-host latencies and cache counters."""
+    import http_client
+    from cache import cache_stats
+
+    parts = [request_seconds.render(), span_seconds.render()]
+    name = 'app_http_client_duration_seconds'
+    lines = [f"# HELP {name} Outbound HTTP request time by host", f"# TYPE {name} histogram"]
+    for host, stats in sorted(http_client.latency_stats().items()):
+        cumulative = 0
+        for bound, count in stats['buckets'].items():
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(float(bound))
+            lines.append(f'{name}_bucket{{host="{_escape(host)}",le="{le}"}} {cumulative}')
+        lines.append(f'{name}_sum{{host="{_escape(host)}"}} {stats["sum"]}')
+        lines.append(f'{name}_count{{host="{_escape(host)}"}} {stats["count"]}')
+    parts.append('\n'.join(lines))
+
+    name = 'app_cache_requests_total'
+    lines = [f"# HELP {name} Cache lookups by cache and result", f"# TYPE {name} counter"]
+    size_lines = ["# HELP app_cache_entries Entries in the in-process cache tier", "# TYPE app_cache_entries gauge"]
+    for cache_name, stats in sorted(cache_stats().items()):
+        for result in ('local_hits', 'shared_hits', 'misses', 'loads', 'waits', 'errors'):
+            lines.append(f'{name}{{cache="{_escape(cache_name)}",result="{result}"}} {stats[result]}')
+        size_lines.append(f'app_cache_entries{{cache="{_escape(cache_name)}"}} {stats["size"]}')
+    parts.append('\n'.join(lines))
+    parts.append('\n'.join(size_lines))
+    return '\n'.join(parts) + '\n'
+
+def init_app(app):
+    """Add request timing, the Server-Timing header and GET /metrics to a Flask app."""
+
+    @app.before_request
+    def start_timing():
+        g.request_started = time.perf_counter()
+        g.spans = []
+
+    @app.after_request
+    def finish_timing(response):
+        if 'request_started' not in g:
+            return response
+        total = time.perf_counter() - g.request_started
+        endpoint = request.endpoint or 'unmatched'
+        request_seconds.observe((endpoint, request.method, str(response.status_code)), total)
+        response.headers['Server-Timing'] = server_timing(g.spans, total)
+        spans = {}
+        for name, elapsed in g.spans:
+            spans[name] = round(spans.get(name, 0) + elapsed * 1000, 1)
+        log('request', endpoint=endpoint, method=request.method, status=response.status_code,
+            ms=round(total * 1000, 1), spans=spans)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
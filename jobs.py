@@ -0,0 +1,252 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from database import save_to_supabase, upload_derivatives_to_s3, mark_word_as_used, update_scoreboard
+from reservations import reservations
+
+JOB_QUEUE_PATH = os.getenv('JOB_QUEUE_PATH', 'jobs.sqlite3')
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 5))
+# A running job whose worker died is picked up again after this many seconds
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 300))
+JOB_POLL_INTERVAL = 1.0
+
+
+class JobQueue:
+    """
+    Durable job queue in a local SQLite file.
+
+    Each job kind is a list of named steps. The result of every completed
+    step is stored with the job, so a retry resumes at the step that
+    failed instead of redoing earlier ones (no second S3 object or row for
+    the same job). Jobs are de-duplicated by an idempotency key, claimed
+    atomically so several processes can share one file, retried with
+    exponential backoff and marked failed after JOB_MAX_ATTEMPTS.
+    """
+
+    def __init__(self, path=JOB_QUEUE_PATH, workers=JOB_WORKERS, max_attempts=JOB_MAX_ATTEMPTS):
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self._kinds = {}
+        self._local = threading.local()
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " idempotency_key TEXT NOT NULL UNIQUE,"
+                " kind TEXT NOT NULL,"
+                " payload TEXT NOT NULL,"
+                " results TEXT NOT NULL DEFAULT '{}',"
+                " state TEXT NOT NULL DEFAULT 'pending',"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " last_error TEXT,"
+                " run_after REAL NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (state, run_after)")
+            self._local.conn = conn
+        return conn
+
+    def register(self, kind, steps):
+        """
+        Register a job kind.
+
+        Args:
+            kind (str): Job kind name
+            steps (list): (name, func) pairs; func(payload, results) returns a
+                JSON-serialisable result that later steps can read
+        """
+        self._kinds[kind] = steps
+
+    def enqueue(self, kind, payload, idempotency_key=None):
+        """
+        Add a job unless one with the same idempotency key exists.
+
+        Returns:
+            int: The id of the new or existing job
+        """
+        key = idempotency_key or uuid.uuid4().hex
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR IGNORE INTO jobs (idempotency_key, kind, payload, run_after, created_at, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (key, kind, json.dumps(payload), now, now, now),
+        )
+        job_id = conn.execute("SELECT id FROM jobs WHERE idempotency_key = ?", (key,)).fetchone()[0]
+        self.start()
+        self._wakeup.set()
+        return job_id
+
+    def _claim(self):
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE (state = 'pending' AND run_after <= ?)"
+                " OR (state = 'running' AND run_after <= ?) ORDER BY id LIMIT 1",
+                (now, now),
+            ).fetchone()
+            if row is not None:
+                # While running, run_after doubles as the lease expiry
+                conn.execute(
+                    "UPDATE jobs SET state = 'running', attempts = attempts + 1,"
+                    " run_after = ?, updated_at = ? WHERE id = ?",
+                    (now + JOB_LEASE_SECONDS, now, row['id']),
+                )
+            conn.execute("COMMIT")
+            return row
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _save_results(self, job_id, results):
+        self._connect().execute(
+            "UPDATE jobs SET results = ?, updated_at = ? WHERE id = ?",
+            (json.dumps(results), time.time(), job_id),
+        )
+
+    def run_job(self, row):
+        """Run the remaining steps of a claimed job and record the outcome."""
+        payload = json.loads(row['payload'])
+        results = json.loads(row['results'])
+        attempts = row['attempts'] + 1
+        conn = self._connect()
+        try:
+            for name, func in self._kinds[row['kind']]:
+                if name in results:
+                    continue
+                results[name] = func(payload, results)
+                self._save_results(row['id'], results)
+        except Exception as e:
+            now = time.time()
+            if attempts >= self.max_attempts:
+                state, run_after = 'failed', now
+            else:
+                state, run_after = 'pending', now + min(2 ** attempts, 300)
+            print(f"Job {row['id']} ({row['kind']}) attempt {attempts} failed: {e}")
+            conn.execute(
+                "UPDATE jobs SET state = ?, last_error = ?, run_after = ?, updated_at = ? WHERE id = ?",
+                (state, str(e), run_after, now, row['id']),
+            )
+            return False
+        conn.execute(
+            "UPDATE jobs SET state = 'done', last_error = NULL, updated_at = ? WHERE id = ?",
+            (time.time(), row['id']),
+        )
+        return True
+
+    def start(self):
+        """Start the worker threads if they are not running yet."""
+        with self._start_lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, name=f'job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _worker_loop(self):
+        while True:
+            try:
+                row = self._claim()
+            except sqlite3.Error as e:
+                print(f"Job claim failed: {e}")
+                row = None
+            if row is None:
+                self._wakeup.wait(JOB_POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+            self.run_job(row)
+
+    def list_jobs(self, state='failed', limit=100):
+        rows = self._connect().execute(
+            "SELECT id, idempotency_key, kind, payload, results, state, attempts, last_error,"
+            " created_at, updated_at FROM jobs WHERE state = ? ORDER BY id DESC LIMIT ?",
+            (state, limit),
+        ).fetchall()
+        jobs = []
+        for row in rows:
+            job = dict(row)
+            job['payload'] = json.loads(job['payload'])
+            job['results'] = json.loads(job['results'])
+            jobs.append(job)
+        return jobs
+
+    def counts(self):
+        rows = self._connect().execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return {state: count for state, count in rows}
+
+    def replay(self, job_id):
+        """
+        Put a failed job back in the queue with a fresh attempt budget.
+        Completed steps are kept, so it resumes where it stopped.
+
+        Returns:
+            bool: False if no failed job has that id
+        """
+        now = time.time()
+        cursor = self._connect().execute(
+            "UPDATE jobs SET state = 'pending', attempts = 0, run_after = ?, updated_at = ?"
+            " WHERE id = ? AND state = 'failed'",
+            (now, now, job_id),
+        )
+        self._wakeup.set()
+        return cursor.rowcount > 0
+
+
+def _check(response):
+    if response.status_code >= 300:
+        raise Exception(f"Supabase returned {response.status_code}: {response.text[:200]}")
+    return response.status_code
+
+def _upload_step(payload, results):
+    return upload_derivatives_to_s3(payload['image_url'], payload['translation'])
+
+def _save_row_step(payload, results):
+    upload = results['upload_s3']
+    return _check(save_to_supabase(upload['s3_key'], payload['word'], payload['translation'],
+                                   derivatives=upload['derivatives'],
+                                   duplicate_of=upload['duplicate_of']))
+
+def _mark_used_step(payload, results):
+    return _check(mark_word_as_used(payload['word']))
+
+def _release_reservation_step(payload, results):
+    # None when a custom word replaced the reserved one, see enqueue_accept
+    if payload['reservation']:
+        reservations.release(payload['word'], payload['reservation'])
+
+def _scoreboard_step(payload, results):
+    response = update_scoreboard(payload['username'], 'accepted')
+    # None when the write-behind buffer took the increment
+    return _check(response) if response is not None else None
+
+# Steps of an accepted image; the s3_key from the first feeds the second
+ACCEPT_IMAGE_STEPS = [
+    ('upload_s3', _upload_step),
+    ('save_row', _save_row_step),
+    ('mark_used', _mark_used_step),
+    ('release_reservation', _release_reservation_step),
+    ('scoreboard', _scoreboard_step),
+]
+
+
+job_queue = JobQueue()
+job_queue.register('accept_image', ACCEPT_IMAGE_STEPS)
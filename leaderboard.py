@@ -0,0 +1,116 @@
+import os
+import sqlite3
+import threading
+import time
+
+LEADERBOARD_CACHE_PATH = os.getenv('LEADERBOARD_CACHE_PATH', 'leaderboard_cache.sqlite3')
+LEADERBOARD_TTL = int(os.getenv('LEADERBOARD_TTL', 30))
+
+
+class LeaderboardStore:
+    """
+    Local copy of the scoreboard table in a SQLite file shared by every
+    gunicorn worker on the host.
+
+    Rows are kept in a table indexed on total, so top-N reads walk the
+    index instead of sorting. `apply` bumps a row in place when this host
+    records a click; `replace_all` reconciles with Supabase once the TTL
+    has passed, and only one worker does that at a time.
+    """
+
+    def __init__(self, path=LEADERBOARD_CACHE_PATH, ttl=LEADERBOARD_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS leaderboard ("
+                " username TEXT PRIMARY KEY, accepted INTEGER NOT NULL DEFAULT 0,"
+                " rejected INTEGER NOT NULL DEFAULT 0, total INTEGER NOT NULL DEFAULT 0)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS leaderboard_total ON leaderboard (total DESC)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL)")
+            self._local.conn = conn
+        return conn
+
+    def is_fresh(self):
+        row = self._connect().execute("SELECT value FROM meta WHERE key='refreshed_at'").fetchone()
+        return row is not None and time.time() - row[0] < self.ttl
+
+    def claim_refresh(self):
+        """
+        Mark the cache as being refreshed by this worker.
+
+        Returns:
+            bool: True if the caller should fetch from Supabase, False if
+                another worker refreshed or claimed it within the TTL
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE key='refreshed_at'").fetchone()
+            if row is not None and time.time() - row[0] < self.ttl:
+                conn.execute("COMMIT")
+                return False
+            # Push the timestamp forward so other workers keep serving the
+            # cached rows while this one fetches
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('refreshed_at', ?)",
+                         (time.time(),))
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def replace_all(self, users):
+        """Replace the cached rows with a full scoreboard from Supabase."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM leaderboard")
+            conn.executemany(
+                "INSERT INTO leaderboard (username, accepted, rejected, total) VALUES (?, ?, ?, ?)",
+                [(u['username'], u.get('accepted') or 0, u.get('rejected') or 0,
+                  (u.get('accepted') or 0) + (u.get('rejected') or 0)) for u in users],
+            )
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('refreshed_at', ?)",
+                         (time.time(),))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def expire(self):
+        self._connect().execute("DELETE FROM meta WHERE key='refreshed_at'")
+
+    def apply(self, username, accepted=0, rejected=0):
+        """Add to a user's counters in place."""
+        self._connect().execute(
+            "INSERT INTO leaderboard (username, accepted, rejected, total) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT (username) DO UPDATE SET accepted = accepted + excluded.accepted,"
+            " rejected = rejected + excluded.rejected, total = total + excluded.total",
+            (username, accepted, rejected, accepted + rejected),
+        )
+
+    def top(self, limit=None):
+        """
+        Return users ordered by total, highest first.
+
+        Returns:
+            list: dicts with username, accepted, rejected and total
+        """
+        query = "SELECT username, accepted, rejected, total FROM leaderboard ORDER BY total DESC"
+        params = ()
+        if limit is not None:
+            query += " LIMIT ?"
+            params = (limit,)
+        rows = self._connect().execute(query, params).fetchall()
+        return [{'username': u, 'accepted': a, 'rejected': r, 'total': t} for u, a, r, t in rows]
+
+
+leaderboard = LeaderboardStore()
@@ -1,203 +1,322 @@
-import requests
+import http_client
 import os
-import boto3
-from flask import Flask, render_template, redirect, url_for, request, jsonify
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
+from flask import Flask, render_template, redirect, url_for, request, jsonify, Response, session, abort
 from database import (
+    in_filter,
     supabase_request,
     SUPABASE_PB_KEY,
-    SUPABASE_URL,
-    AWS_ACCESS_KEY,
-    AWS_SECRET_ACCESS_KEY
+    SUPABASE_URL
 )
+from cache import Cache
+from storage import get_s3_client, S3_BUCKET, AWS_REGION
+import instrumentation
+from instrumentation import span
 
 # Table for review
 REVIEW_TABLE = 'speech-therapy-s3-keys'
-S3_BUCKET = 'therapy-app-s3'
-AWS_REGION = 'eu-north-1'
+# Stable, indexed column to page on; offsets skip rows as reviews shrink the
+# unreviewed set
+REVIEW_KEY_COLUMN = os.getenv('REVIEW_KEY_COLUMN', 'id')
+REVIEW_PAGE_SIZE = 20
+PRESIGN_EXPIRES = 3600
+# Hand out a cached URL only while it has at least this long left to live
+PRESIGN_REFRESH_MARGIN = 300
+# Serve images through /image/<s3_key> with browser caching headers
+# instead of linking presigned S3 URLs directly
+IMAGE_PROXY = os.getenv('REVIEWER_IMAGE_PROXY', '0') == '1'
+IMAGE_MAX_AGE = 86400
+# Derivative used for grid tiles (about 300px wide), in order of preference
+GRID_DERIVATIVES = ('400.webp', '400.jpeg')
+# How long a page fetched ahead for a reviewer may be served; other
+# reviewers may decide its records in the meantime
+REVIEW_PREFETCH_TTL = int(os.getenv('REVIEW_PREFETCH_TTL', 60))
+
 app = Flask(__name__)
+# A random per-process key only works with a single worker, see gunicorn.conf.py
+app.secret_key = os.getenv('FLASK_SECRET_KEY') or os.urandom(24)
+instrumentation.init_app(app)
 
-def update_confirmation(s3_key, is_confirmed):
-    """Set is_confirmed to true or false for a record"""
+_presigned_urls = Cache('presigned_urls', maxsize=10000, ttl=PRESIGN_EXPIRES - PRESIGN_REFRESH_MARGIN)
+
+def warm_up():
+    """Build the S3 client before the first page needs it, see gunicorn.conf.py."""
+    try:
+        get_s3_client(AWS_REGION)
+    except Exception as e:
+        print(f"Warm-up of get_s3_client failed, it will be retried on first use: {e}")
+
+def update_confirmations(s3_keys, is_confirmed):
+    """
+    Set is_confirmed to true or false for many records in one PATCH.
+    
+    Args:
+        s3_keys: Keys of the records to update
+        is_confirmed: The decision for all of them
+        
+    Returns:
+        bool: True if Supabase accepted the update
+    """
+    if not s3_keys:
+        return True
     headers = {
         "apikey": SUPABASE_PB_KEY,
         "Authorization": f"Bearer {SUPABASE_PB_KEY}",
         "Content-Type": "application/json"
     }
     
-    url = f"{SUPABASE_URL}/rest/v1/{REVIEW_TABLE}?s3_key=eq.{s3_key}"
-    response = requests.patch(url, headers=headers, json={"is_confirmed": is_confirmed})
+    url = f"{SUPABASE_URL}/rest/v1/{REVIEW_TABLE}?s3_key={in_filter(s3_keys)}"
+    with span(f'supabase.{REVIEW_TABLE}'):
+        response = http_client.patch(url, headers=headers, json={"is_confirmed": is_confirmed})
     return response.status_code in (200, 204)
 
-def get_records(limit=20, offset=0):
-    """Get paginated records from Supabase, only unreviewed"""
-    # Add filter: is_confirmed is null
-    query_params = f"select=*&is_confirmed=is.null&limit={limit}&offset={offset}"
+def update_confirmation(s3_key, is_confirmed):
+    """Set is_confirmed to true or false for a record"""
+    return update_confirmations([s3_key], is_confirmed)
+
+def get_records(limit=REVIEW_PAGE_SIZE, after=None):
+    """
+    Get a page of unreviewed records from Supabase.
+    
+    Args:
+        limit: Records per page
+        after (int): REVIEW_KEY_COLUMN value of the last record of the
+            previous page, or None for the first page
+            
+    Returns:
+        list: Records ordered by REVIEW_KEY_COLUMN
+    """
+    query_params = (f"select=*&is_confirmed=is.null"
+                    f"&order={REVIEW_KEY_COLUMN}.asc&limit={int(limit)}")
+    if after is not None:
+        query_params += f"&{REVIEW_KEY_COLUMN}=gt.{int(after)}"
     response = supabase_request('GET', REVIEW_TABLE, query_params=query_params)
     if response.status_code == 200:
         return response.json()
     return []
 
+def get_image_urls(s3_keys):
+    """
+    Return presigned URLs for many S3 objects.
+    
+    URLs are cached until PRESIGN_REFRESH_MARGIN before they expire, so the
+    same thumbnail keeps the same URL across page loads (and workers) and
+    the browser cache can reuse it. Misses are signed with a single shared
+    client.
+    
+    Returns:
+        dict: s3_key -> URL (None if signing failed)
+    """
+    urls = _presigned_urls.get_many(s3_keys)
+    missing = [s3_key for s3_key in s3_keys if s3_key not in urls]
+    
+    if missing:
+        s3 = get_s3_client(AWS_REGION)
+        signed = {}
+        with span('s3.presign'):
+            for s3_key in missing:
+                try:
+                    signed[s3_key] = s3.generate_presigned_url(
+                        'get_object',
+                        Params={'Bucket': S3_BUCKET, 'Key': s3_key},
+                        ExpiresIn=PRESIGN_EXPIRES
+                    )
+                except Exception as e:
+                    print(f"Error generating URL for {s3_key}: {e}")
+                    urls[s3_key] = None
+        _presigned_urls.set_many(signed.items())
+        urls.update(signed)
+    
+    return urls
+
 def get_image_url(s3_key):
     """Generate a presigned URL for an S3 object"""
-    s3 = boto3.client(
-        's3',
-        region_name=AWS_REGION,
-        aws_access_key_id=AWS_ACCESS_KEY,
-        aws_secret_access_key=AWS_SECRET_ACCESS_KEY
-    )
+    return get_image_urls([s3_key])[s3_key]
+
+def grid_image_key(record):
+    """Pick the smallest derivative that still looks sharp in a grid tile."""
+    derivatives = record.get('derivatives') or {}
+    for name in GRID_DERIVATIVES:
+        if derivatives.get(name):
+            return derivatives[name]
+    return record.get('s3_key')
+
+def add_image_urls(records):
+    """Set record['image_url'] on every record that has an s3_key."""
+    keys = {id(record): grid_image_key(record) for record in records}
+    s3_keys = [key for key in keys.values() if key]
+    if IMAGE_PROXY:
+        urls = {s3_key: url_for('image', s3_key=s3_key) for s3_key in s3_keys}
+    else:
+        urls = get_image_urls(s3_keys)
+    for record in records:
+        if keys[id(record)]:
+            record['image_url'] = urls.get(keys[id(record)])
+    return records
+
+def fetch_page(after=None):
+    """
+    Load a page of records and sign its grid images, so serving it later
+    only reads the presigned URL cache.
+    """
+    records = get_records(after=after)
+    if not IMAGE_PROXY:
+        get_image_urls([key for key in map(grid_image_key, records) if key])
+    return records
+
+class PageBuffer:
+    """
+    Per-session look-ahead: after a reviewer gets a page, the page behind
+    its cursor is fetched in the background and kept until they ask for it.
+    """
+    
+    def __init__(self, ttl=REVIEW_PREFETCH_TTL, workers=4):
+        self._pages = TTLCache(maxsize=1024, ttl=ttl)  # session id -> (after, future)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='review-prefetch')
+        self.hits = 0
+        self.misses = 0
     
-    url = s3.generate_presigned_url(
-        'get_object',
-        Params={'Bucket': S3_BUCKET, 'Key': s3_key},
-        ExpiresIn=3600
-    )
+    def get(self, session_id, after):
+        """Return the page after `after`, from the buffer when it was prefetched."""
+        with self._lock:
+            buffered = self._pages.pop(session_id, None)
+        if buffered and buffered[0] == after:
+            try:
+                records = buffered[1].result()
+                self.hits += 1
+                return records
+            except Exception as e:
+                print(f"Prefetched review page failed: {e}")
+        self.misses += 1
+        return fetch_page(after)
     
-    return url
+    def prefetch(self, session_id, after):
+        future = self._executor.submit(fetch_page, after)
+        with self._lock:
+            self._pages[session_id] = (after, future)
+
+page_buffer = PageBuffer()
+
+def get_session_id():
+    if 'sid' not in session:
+        session['sid'] = uuid.uuid4().hex
+    return session['sid']
+
+def next_page(after=None):
+    """
+    Serve a page for the current session and start fetching the one after it.
+    
+    Returns:
+        tuple: (records with image_url set, cursor of the next page or None)
+    """
+    session_id = get_session_id()
+    records = page_buffer.get(session_id, after)
+    add_image_urls(records)
+    next_after = records[-1].get(REVIEW_KEY_COLUMN) if len(records) == REVIEW_PAGE_SIZE else None
+    if next_after is not None:
+        page_buffer.prefetch(session_id, next_after)
+    return records, next_after
+
+def get_after():
+    """Read the `after` page cursor from the query string; 400 unless it is an integer."""
+    after = request.args.get('after')
+    if not after:
+        return None
+    try:
+        return int(after)
+    except ValueError:
+        abort(400, description="after must be an integer")
 
 @app.route('/')
 def index():
-    page = int(request.args.get('page', 1))
-    per_page = 20
-    offset = (page - 1) * per_page
-    records = get_records(limit=per_page, offset=offset)
-    # Add S3 URLs to records
-    for record in records:
-        if record.get('s3_key'):
-            try:
-                record['image_url'] = get_image_url(record['s3_key'])
-            except Exception as e:
-                print(f"Error generating URL for {record['s3_key']}: {e}")
-                record['image_url'] = None
-    return render_template('reviewer.html', records=records, page=page)
+    after = get_after()
+    records, next_after = next_page(after)
+    return render_template('reviewer.html', records=records, after=after, next_after=next_after)
+
+@app.route('/api/records')
+def api_records():
+    """JSON page of unreviewed records for the infinite-scroll grid."""
+    records, next_after = next_page(get_after())
+    return jsonify({'records': records, 'next_after': next_after})
+
+@app.route('/metrics/prefetch')
+def prefetch_metrics():
+    return jsonify({'hits': page_buffer.hits, 'misses': page_buffer.misses})
+
+@app.route('/image/<path:s3_key>')
+def image(s3_key):
+    """
+    Stream an S3 object with long-lived cache headers. Keys contain a UUID
+    and are never overwritten, so the browser may keep them indefinitely.
+    """
+    s3 = get_s3_client(AWS_REGION)
+    params = {'Bucket': S3_BUCKET, 'Key': s3_key}
+    if request.headers.get('If-None-Match'):
+        params['IfNoneMatch'] = request.headers['If-None-Match']
+    try:
+        with span('s3.get'):
+            obj = s3.get_object(**params)
+    except s3.exceptions.NoSuchKey:
+        return '', 404
+    except Exception as e:
+        # botocore reports 304 Not Modified as a ClientError
+        if getattr(e, 'response', {}).get('Error', {}).get('Code') == '304':
+            return Response(status=304, headers={'ETag': params['IfNoneMatch']})
+        raise
+    
+    headers = {
+        'ETag': obj['ETag'],
+        'Cache-Control': f'public, max-age={IMAGE_MAX_AGE}, immutable',
+        'Content-Length': str(obj['ContentLength'])
+    }
+    return Response(obj['Body'].iter_chunks(64 * 1024),
+                    mimetype=obj.get('ContentType', 'image/jpeg'),
+                    headers=headers)
+
+@app.route('/decisions', methods=['POST'])
+def decisions():
+    """
+    Apply queued decisions from the grid: {"confirm": [s3_key, ...],
+    "deny": [s3_key, ...]}. Each list is one PATCH.
+    """
+    data = request.get_json(force=True, silent=True) or {}
+    confirm_keys = [key for key in data.get('confirm', []) if isinstance(key, str)]
+    deny_keys = [key for key in data.get('deny', []) if isinstance(key, str)]
+    failed = []
+    if not update_confirmations(confirm_keys, True):
+        failed.extend(confirm_keys)
+    if not update_confirmations(deny_keys, False):
+        failed.extend(deny_keys)
+    return jsonify({'applied': len(confirm_keys) + len(deny_keys) - len(failed),
+                    'failed': failed}), (502 if failed else 200)
 
 @app.route('/confirm/<s3_key>', methods=['GET', 'POST'])
 def confirm(s3_key):
-    page = request.args.get('page', 1)
+    after = get_after()
     is_ajax = request.args.get('ajax')
     success = update_confirmation(s3_key, True)
     if is_ajax:
         return ('', 200) if success else ('', 400)
     if success:
-        return redirect(url_for('index', page=page))
+        return redirect(url_for('index', after=after))
     else:
         return f"Error confirming record"
 
 @app.route('/deny/<s3_key>', methods=['GET', 'POST'])
 def deny(s3_key):
-    page = request.args.get('page', 1)
+    after = get_after()
     is_ajax = request.args.get('ajax')
     success = update_confirmation(s3_key, False)
     if is_ajax:
         return ('', 200) if success else ('', 400)
     if success:
-        return redirect(url_for('index', page=page))
+        return redirect(url_for('index', after=after))
     else:
         return f"Error denying record"
 
 if __name__ == "__main__":
-    # Create templates directory if it doesn't exist
-    os.makedirs('templates', exist_ok=True)
-    
-    # Create the HTML template file
-    with open('templates/reviewer.html', 'w') as f:
-        f.write('''
-<!DOCTYPE html>
-<html>
-<head>
-    <title>Image-Word Pair Reviewer</title>
-    <style>
-        body { font-family: Arial, sans-serif; margin: 20px; }
-        .grid-container {
-            display: grid;
-            grid-template-columns: repeat(3, 1fr); /* 3 columns */
-            gap: 20px;
-        }
-        .image-card { border: 1px solid #ddd; padding: 15px; border-radius: 5px; background: #fff; }
-        .image-container { max-width: 300px; margin: 10px 0; }
-        img { max-width: 100%; height: auto; }
-        .button-container { display: flex; gap: 10px; }
-        .confirm-btn { background: #4CAF50; color: white; border: none; padding: 8px 15px; border-radius: 4px; cursor: pointer; }
-        .deny-btn { background: #ff9800; color: white; border: none; padding: 8px 15px; border-radius: 4px; cursor: pointer; }
-        .confirmed { background-color: #e6ffe6; border-color: #4CAF50; }
-        .denied { background-color: #fff0e6; border-color: #ff9800; }
-    </style>
-</head>
-<body>
-    <h1>Image-Word Pair Reviewer</h1>
-    
-    {% if records %}
-        <p>Found {{ records|length }} records to review.</p>
-        
-        <div class="grid-container">
-        {% for record in records %}
-            <div class="image-card {% if record.get('is_confirmed') == true %}confirmed{% elif record.get('is_confirmed') == false %}denied{% endif %}">
-                <h3>Word: {{ record.get('tr_word', 'N/A') }}</h3>
-                <p>Confirmed: {{ record.get('is_confirmed', 'Not set') }}</p>
-                <p>S3 Key: {{ record.get('s3_key', 'N/A') }}</p>
-                
-                <div class="image-container">
-                    {% if record.get('image_url') %}
-                        <img src="{{ record.get('image_url') }}" alt="{{ record.get('tr_word', 'Image') }}">
-                    {% else %}
-                        <p>No image URL available</p>
-                    {% endif %}
-                </div>
-                
-                <div class="button-container">
-                    {% if record.get('is_confirmed') != true %}
-                    <button class="confirm-btn" onclick="confirmPair('{{ record.get('s3_key', '') }}', this)">Confirm Pair</button>
-                    {% endif %}
-                    
-                    {% if record.get('is_confirmed') != false %}
-                    <button class="deny-btn" onclick="denyPair('{{ record.get('s3_key', '') }}', this)">Deny Pair</button>
-                    {% endif %}
-                </div>
-            </div>
-        {% endfor %}
-        </div>
-        
-        <div style="margin-top: 20px;">
-            {% if page > 1 %}
-                <a href="{{ url_for('index', page=page-1) }}">Previous</a>
-            {% endif %}
-            <span>Page {{ page }}</span>
-            {% if records|length == 20 %}
-                <a href="{{ url_for('index', page=page+1) }}">Next</a>
-            {% endif %}
-        </div>
-    {% else %}
-        <p>No records found.</p>
-    {% endif %}
-    
-    <script>
-    function updateCardStatus(button, status) {
-        const card = button.closest('.image-card');
-        card.classList.remove('confirmed', 'denied');
-        if (status === true) {
-            card.classList.add('confirmed');
-            card.querySelector('.confirm-btn').style.display = 'none';
-            if (card.querySelector('.deny-btn')) card.querySelector('.deny-btn').style.display = 'inline-block';
-            card.querySelector('p:nth-child(2)').innerText = 'Confirmed: true';
-        } else if (status === false) {
-            card.classList.add('denied');
-            card.querySelector('.deny-btn').style.display = 'none';
-            if (card.querySelector('.confirm-btn')) card.querySelector('.confirm-btn').style.display = 'inline-block';
-            card.querySelector('p:nth-child(2)').innerText = 'Confirmed: false';
-        }
-    }
-
-    function confirmPair(s3_key, button) {
-        fetch(`/confirm/${s3_key}?ajax=1`, { method: 'POST' })
-            .then(res => res.ok ? updateCardStatus(button, true) : alert('Error confirming'))
-    }
-
-    function denyPair(s3_key, button) {
-        fetch(`/deny/${s3_key}?ajax=1`, { method: 'POST' })
-            .then(res => res.ok ? updateCardStatus(button, false) : alert('Error denying'))
-    }
-    </script>
-</body>
-</html>
-        ''')
-    
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True)
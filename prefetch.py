@@ -0,0 +1,396 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+
+from image_fetcher import get_candidates, demote_stored_images, provider_status
+from translation import translate
+from reservations import reservations
+from cache import SQLiteStore, get_store
+
+PREFETCH_QUEUE_SIZE = int(os.getenv('PREFETCH_QUEUE_SIZE', 8))
+PREFETCH_WORKERS = int(os.getenv('PREFETCH_WORKERS', 2))
+PREFETCH_LEASE_SECONDS = int(os.getenv('PREFETCH_LEASE_SECONDS', 900))
+# The shared copy of a session lease outlives the local one by this much, so
+# a worker never mistakes its own lease for one decided elsewhere
+SHARED_LEASE_GRACE = 60
+
+# Alternates offered to the reviewer per word
+MAX_CANDIDATES = int(os.getenv('MAX_CANDIDATES', 8))
+
+# How often refill threads check whether a provider has quota again after
+# a word came back without any image
+PROVIDER_RETRY_SECONDS = 5
+
+# Returned for a shared lease record that could not be read
+_UNKNOWN = object()
+
+
+class NoCandidates(Exception):
+    """No provider returned an image for the word, e.g. all are out of quota."""
+
+
+def providers_available():
+    """True if at least one image provider may be called right now."""
+    status = provider_status()
+    return not status or any(status.values())
+
+
+def build_work_item():
+    """
+    Reserve an unused word and run the full word -> image -> translation
+    chain for it once. The reservation keeps other workers and processes
+    from building the same word.
+
+    Returns:
+        dict: {'word', 'image_urls', 'candidates', 'translation',
+            'reservation', 'reserved_until'} or None if no word is left
+
+    Raises:
+        NoCandidates: No image was found; the word is released again
+    """
+    token = uuid.uuid4().hex
+    reserved_until = time.time() + reservations.lease_seconds
+    word = reservations.claim(token)
+    if not word:
+        return None
+    try:
+        item = build_work_item_for(word)
+        if not item['image_urls']:
+            raise NoCandidates(word)
+    except Exception:
+        reservations.release(word, token)
+        raise
+    item['reservation'] = token
+    item['reserved_until'] = reserved_until
+    return item
+
+
+def build_work_item_for(word):
+    """
+    Build a work item for a specific word.
+
+    Args:
+        word (str): English word as stored in word-list
+
+    Returns:
+        dict: {'word', 'image_urls', 'candidates', 'translation'}
+    """
+    word = word.title()
+    candidates = demote_stored_images(get_candidates(word), limit=MAX_CANDIDATES)[:MAX_CANDIDATES]
+    translation = translate(word).title()
+
+    return {
+        'word': word,
+        'image_urls': [c['url'] for c in candidates],
+        'candidates': [
+            {key: c[key] for key in ('url', 'width', 'height', 'source', 'score')}
+            for c in candidates
+        ],
+        'translation': translation,
+    }
+
+
+class PrefetchQueue:
+    """
+    Bounded queue of ready work items, refilled by background threads.
+
+    Items are handed out with a per-session lease: a session that reloads the
+    page gets its leased item back instead of a new word, and a word that is
+    queued or leased is never handed to a second session. Leases are released
+    when the reviewer accepts or rejects, and expire after `lease_seconds`.
+
+    Items are per process, so under gunicorn each worker keeps its own
+    queue; every item holds a word reservation, so no two workers build or
+    show the same word. A reservation is renewed when its item is handed
+    out, and an item whose reservation lapsed to someone else is dropped.
+
+    gunicorn does not route a session back to the worker that leased it,
+    so each lease's word and reservation token are also kept in the shared
+    store. That record is the truth: a worker drops a local lease it no
+    longer matches (decided or replaced through another worker), and
+    whichever worker replaces or clears a record takes care of its
+    reservation.
+    """
+
+    namespace = 'session_leases'
+
+    def __init__(self, maxsize=PREFETCH_QUEUE_SIZE, workers=PREFETCH_WORKERS,
+                 lease_seconds=PREFETCH_LEASE_SECONDS, store=None):
+        self.maxsize = maxsize
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        # Leases must be shared even when CACHE_BACKEND=local
+        self._store = store or get_store() or SQLiteStore()
+
+        self._items = deque()
+        self._leases = {}    # session_id -> (item, expires_at)
+        self._claimed = set()  # lowercase words that are queued or leased
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._threads = []
+        self._exhausted_until = 0
+
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'refills': 0,
+            'refill_errors': 0,
+            'refill_seconds_total': 0.0,
+            'refill_seconds_last': 0.0,
+            'refill_seconds_max': 0.0,
+            'lost_reservations': 0,
+            'stale_leases': 0,
+            'empty_builds': 0,
+        }
+
+    def start(self):
+        """Start the refill threads if they are not running yet."""
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._refill_loop,
+                                          name=f'prefetch-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def acquire(self, session_id):
+        """
+        Hand a work item to a session.
+
+        Args:
+            session_id (str): Stable id of the reviewer session
+
+        Returns:
+            dict: A work item, or None when the queue is empty
+        """
+        self.start()
+        while True:
+            now = time.time()
+            shared = self._get_shared(session_id)
+            with self._lock:
+                expired = self._expire_leases(now)
+
+                lease = self._leases.get(session_id)
+                if lease and not self._matches(lease[0], shared):
+                    # Decided or replaced through another worker
+                    self._drop_lease(session_id)
+                    self._stats['stale_leases'] += 1
+                    lease = None
+                if lease:
+                    item = lease[0]
+                    self._leases[session_id] = (item, now + self.lease_seconds)
+                elif not self._items:
+                    self._stats['misses'] += 1
+                    item = None
+                else:
+                    item = self._items.popleft()
+                    self._leases[session_id] = (item, now + self.lease_seconds)
+                    self._stats['hits'] += 1
+                    self._not_full.notify()
+            self._release_reservations(expired)
+
+            if item is None:
+                return None
+            if self._keep_reserved(item):
+                self._share_lease(session_id, item, shared)
+                return item
+            # The word went to another reviewer while this item waited
+            with self._lock:
+                self._leases.pop(session_id, None)
+                self._claimed.discard(item['word'].lower())
+                self._stats['lost_reservations'] += 1
+
+    def lease(self, session_id, item):
+        """
+        Record a lease for an item that was built outside the queue.
+
+        Returns:
+            bool: False if the word is already claimed by another session
+        """
+        key = item['word'].lower()
+        shared = self._get_shared(session_id)
+        with self._lock:
+            if key in self._claimed:
+                return False
+            self._claimed.add(key)
+            if session_id in self._leases:
+                self._drop_lease(session_id)
+            self._leases[session_id] = (item, time.time() + self.lease_seconds)
+        self._share_lease(session_id, item, shared)
+        return True
+
+    def release(self, session_id, release_reservation=True):
+        """
+        Drop the lease held by a session once its word has been decided.
+
+        Args:
+            session_id (str): Stable id of the reviewer session
+            release_reservation (bool): Also free the word reservation; pass
+                False when a job still has to mark the word as used
+
+        Returns:
+            dict: The item that was leased, or None. When the lease was
+                made by another worker only 'word' and 'reservation' are set.
+        """
+        shared = self._get_shared(session_id)
+        with self._lock:
+            lease = self._drop_lease(session_id)
+        item = lease[0] if lease else None
+        if shared is not _UNKNOWN:
+            if shared is not None:
+                self._clear_shared(session_id)
+            if item is None or not self._matches(item, shared):
+                # The session's current word was leased by another worker
+                # (or by nobody); a stale local lease was already handled
+                item = shared
+        if item and release_reservation:
+            self._release_reservations([item])
+        return item
+
+    def metrics(self):
+        """Return queue depth, lease count and refill latency figures."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['queue_depth'] = len(self._items)
+            stats['queue_capacity'] = self.maxsize
+            stats['active_leases'] = len(self._leases)
+            stats['workers'] = len(self._threads)
+        stats['reservations'] = dict(reservations.stats)
+        refills = stats['refills']
+        stats['refill_seconds_avg'] = stats['refill_seconds_total'] / refills if refills else 0.0
+        return stats
+
+    def _drop_lease(self, session_id):
+        """Forget a session's local lease (lock held); returns it or None."""
+        lease = self._leases.pop(session_id, None)
+        if lease:
+            self._claimed.discard(lease[0]['word'].lower())
+            self._not_full.notify()
+        return lease
+
+    @staticmethod
+    def _matches(item, shared):
+        if shared is _UNKNOWN:
+            # Store unavailable: trust the local lease
+            return True
+        return shared is not None and shared.get('reservation') == item.get('reservation')
+
+    def _get_shared(self, session_id):
+        """Return the session's shared lease record, None if it has none, or _UNKNOWN."""
+        try:
+            entry = self._store.get_many(self.namespace, [session_id]).get(session_id)
+        except sqlite3.Error as e:
+            print(f"Shared session lease read failed: {e}")
+            return _UNKNOWN
+        return entry[0] if entry else None
+
+    def _share_lease(self, session_id, item, previous):
+        """Record a lease in the shared store, freeing the reservation of the record it replaces."""
+        record = {'word': item['word'], 'reservation': item.get('reservation')}
+        try:
+            self._store.set_many(self.namespace, [(session_id, record)],
+                                 ttl=self.lease_seconds + SHARED_LEASE_GRACE)
+        except sqlite3.Error as e:
+            print(f"Shared session lease write failed: {e}")
+            return
+        if previous and previous is not _UNKNOWN and previous.get('reservation') != record['reservation']:
+            # Left behind by another worker that served this session before
+            self._release_reservations([previous])
+
+    def _clear_shared(self, session_id):
+        try:
+            self._store.delete(self.namespace, session_id)
+        except sqlite3.Error as e:
+            print(f"Shared session lease delete failed: {e}")
+
+    def _expire_leases(self, now):
+        """Drop expired leases (lock held); returns their items."""
+        expired = [sid for sid, (_, expires_at) in self._leases.items() if expires_at < now]
+        items = []
+        for sid in expired:
+            item, _ = self._leases.pop(sid)
+            self._claimed.discard(item['word'].lower())
+            items.append(item)
+        if expired:
+            self._not_full.notify_all()
+        return items
+
+    def _keep_reserved(self, item):
+        """Renew an item's reservation if it would lapse before the session lease."""
+        if not item.get('reservation'):
+            return True
+        now = time.time()
+        if item['reserved_until'] - now > self.lease_seconds:
+            return True
+        if reservations.renew(item['word'], item['reservation']):
+            item['reserved_until'] = now + reservations.lease_seconds
+            return True
+        return False
+
+    def _release_reservations(self, items):
+        for item in items:
+            if item.get('reservation'):
+                reservations.release(item['word'], item['reservation'])
+
+    def _refill_loop(self):
+        while True:
+            with self._lock:
+                while (len(self._items) >= self.maxsize
+                       or time.time() < self._exhausted_until):
+                    self._not_full.wait(timeout=5)
+
+            started = time.perf_counter()
+            try:
+                item, exhausted = self._build_unclaimed()
+            except NoCandidates:
+                with self._lock:
+                    self._stats['empty_builds'] += 1
+                # Usually every provider is out of quota; wait for one
+                # instead of burning reservations on imageless items
+                time.sleep(1)
+                while not providers_available():
+                    time.sleep(PROVIDER_RETRY_SECONDS)
+                continue
+            except Exception as e:
+                print(f"Prefetch refill failed: {e}")
+                with self._lock:
+                    self._stats['refill_errors'] += 1
+                time.sleep(1)
+                continue
+            elapsed = time.perf_counter() - started
+
+            with self._lock:
+                if item is None:
+                    # Back off instead of hammering Supabase: long when the
+                    # word list is empty, short when every draw was taken
+                    self._exhausted_until = time.time() + (30 if exhausted else 1)
+                    continue
+                self._stats['refills'] += 1
+                self._stats['refill_seconds_total'] += elapsed
+                self._stats['refill_seconds_last'] = elapsed
+                self._stats['refill_seconds_max'] = max(self._stats['refill_seconds_max'], elapsed)
+                self._items.append(item)
+
+    def _build_unclaimed(self):
+        """Return (item, exhausted) for a word nobody else holds."""
+        item = build_work_item()
+        if item is None:
+            # Every unused word is used or reserved
+            return None, True
+        with self._lock:
+            self._claimed.add(item['word'].lower())
+        return item, False
+
+
+work_queue = PrefetchQueue()
+
+
+def get_session_id(session):
+    """Return a stable id for a Flask session, creating one if needed."""
+    if 'sid' not in session:
+        session['sid'] = uuid.uuid4().hex
+    return session['sid']
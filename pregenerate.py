@@ -0,0 +1,276 @@
+"""
+Bulk pre-generation of word/image pairs, so reviewers only confirm or
+deny them in pair_reviewer.
+
+Every unused word in word-list is streamed through
+
+    search -> translate -> download/resize/S3 -> Supabase row
+
+with a bounded queue and worker pool per stage. Progress is appended to a
+checkpoint file; a rerun skips finished words and resumes half-finished
+ones at the stage they reached. Each word is reserved (see reservations.py)
+before it enters the pipeline, so words a reviewer is looking at are
+skipped and reviewers are not handed words being generated here.
+
+    python pregenerate.py --limit 500 --search-workers 4 --upload-workers 4
+"""
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from database import iter_word_list, save_to_supabase, upload_derivatives_to_s3, mark_word_as_used
+from image_fetcher import get_candidates, demote_stored_images
+from reservations import reservations
+from translation import translate_batch
+
+_DONE = object()
+
+
+class Stage:
+    """A bounded input queue drained by a fixed pool of worker threads."""
+
+    def __init__(self, name, func, workers, queue_size, stats):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stats = stats
+        self.threads = []
+        self.next = None
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'{self.name}-{i}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def put(self, item):
+        self.queue.put(item)
+
+    def close(self):
+        """Wait for this stage to drain, then close the next one."""
+        for _ in self.threads:
+            self.queue.put(_DONE)
+        for thread in self.threads:
+            thread.join()
+        if self.next:
+            self.next.close()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _DONE:
+                return
+            try:
+                result = self.func(item)
+            except Exception as e:
+                self.stats.record(self.name, 'failed')
+                self.stats.checkpoint(item['word'], 'failed', error=f"{self.name}: {e}")
+                continue
+            self.stats.record(self.name, 'ok')
+            if result is not None and self.next:
+                self.next.put(result)
+
+
+class BatchStage(Stage):
+    """A stage that hands its function up to batch_size items at a time."""
+
+    def __init__(self, name, func, batch_size, queue_size, stats, max_wait=2.0):
+        super().__init__(name, func, 1, queue_size, stats)
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+
+    def _run(self):
+        finished = False
+        while not finished:
+            batch = []
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get(timeout=max(deadline - time.monotonic(), 0.01))
+                except queue.Empty:
+                    break
+                if item is _DONE:
+                    finished = True
+                    break
+                batch.append(item)
+            if not batch:
+                continue
+            try:
+                results = self.func(batch)
+            except Exception as e:
+                for item in batch:
+                    self.stats.record(self.name, 'failed')
+                    self.stats.checkpoint(item['word'], 'failed', error=f"{self.name}: {e}")
+                continue
+            for result in results:
+                self.stats.record(self.name, 'ok')
+                if self.next:
+                    self.next.put(result)
+
+
+class Progress:
+    """Per-stage counters, throughput reporting and the checkpoint file."""
+
+    def __init__(self, checkpoint_path, owner=None):
+        self.checkpoint_path = checkpoint_path
+        # Reservation token of this run; released when a word finishes
+        self.owner = owner
+        self.counts = {}
+        self.started = time.monotonic()
+        self.completed = 0
+        self._lock = threading.Lock()
+        self.state = self._load()
+        self._file = open(checkpoint_path, 'a')
+
+    def _load(self):
+        state = {}
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        state[entry['word']] = entry
+        return state
+
+    def checkpoint(self, word, stage, **fields):
+        entry = {'word': word, 'stage': stage, 'at': time.time(), **fields}
+        with self._lock:
+            self.state[word] = entry
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+            if stage in ('done', 'no_image'):
+                self.completed += 1
+        if self.owner and stage in ('done', 'no_image', 'failed'):
+            reservations.release(word, self.owner)
+
+    def record(self, stage, outcome):
+        with self._lock:
+            key = (stage, outcome)
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def report(self):
+        with self._lock:
+            elapsed = time.monotonic() - self.started
+            rate = self.completed / elapsed * 60 if elapsed else 0
+            stages = ', '.join(f"{stage} {outcome}={count}" for (stage, outcome), count in sorted(self.counts.items()))
+        print(f"[{elapsed:7.0f}s] {self.completed} words done, {rate:.1f} words/min | {stages}")
+
+    def close(self):
+        self._file.close()
+
+
+def build_pipeline(progress, search_workers, upload_workers, save_workers, queue_size):
+    def search(item):
+        candidates = demote_stored_images(get_candidates(item['word']), limit=5)
+        if not candidates:
+            progress.checkpoint(item['word'], 'no_image')
+            return None
+        item['image_url'] = candidates[0]['url']
+        return item
+
+    def translate(batch):
+        translations = translate_batch([item['word'] for item in batch])
+        for item, translation in zip(batch, translations):
+            item['translation'] = translation.title()
+            progress.checkpoint(item['word'], 'translated',
+                                image_url=item['image_url'], translation=item['translation'])
+        return batch
+
+    def upload(item):
+        item['upload'] = upload_derivatives_to_s3(item['image_url'], item['translation'])
+        progress.checkpoint(item['word'], 'uploaded', image_url=item['image_url'],
+                            translation=item['translation'], upload=item['upload'])
+        return item
+
+    def save(item):
+        upload = item['upload']
+        response = save_to_supabase(upload['s3_key'], item['word'], item['translation'],
+                                    derivatives=upload['derivatives'],
+                                    duplicate_of=upload.get('duplicate_of'))
+        if response.status_code >= 300:
+            raise Exception(f"Supabase returned {response.status_code}")
+        mark_word_as_used(item['word'])
+        progress.checkpoint(item['word'], 'done', s3_key=upload['s3_key'])
+        return None
+
+    stages = [
+        Stage('search', search, search_workers, queue_size, progress),
+        BatchStage('translate', translate, 128, queue_size, progress),
+        Stage('upload', upload, upload_workers, queue_size, progress),
+        Stage('save', save, save_workers, queue_size, progress),
+    ]
+    for stage, following in zip(stages, stages[1:]):
+        stage.next = following
+    for stage in stages:
+        stage.start()
+    return {stage.name: stage for stage in stages}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--limit', type=int, default=None, help='stop after this many words')
+    parser.add_argument('--search-workers', type=int, default=4)
+    parser.add_argument('--upload-workers', type=int, default=4)
+    parser.add_argument('--save-workers', type=int, default=2)
+    parser.add_argument('--queue-size', type=int, default=64, help='items buffered per stage')
+    parser.add_argument('--checkpoint', default='pregenerate.checkpoint.jsonl')
+    parser.add_argument('--report-every', type=float, default=10, help='seconds between progress lines')
+    args = parser.parse_args()
+
+    progress = Progress(args.checkpoint, owner=uuid.uuid4().hex)
+    stages = build_pipeline(progress, args.search_workers, args.upload_workers,
+                            args.save_workers, args.queue_size)
+
+    stop_reporting = threading.Event()
+
+    def report_loop():
+        while not stop_reporting.wait(args.report_every):
+            progress.report()
+
+    threading.Thread(target=report_loop, daemon=True).start()
+
+    fed = 0
+    reserved_elsewhere = 0
+    for rows in iter_word_list(only_unused=True):
+        for row in rows:
+            word = row['eng_word'].title()
+            previous = progress.state.get(word, {})
+            # Resume half-finished words at the stage they reached
+            if previous.get('stage') in ('done', 'no_image'):
+                continue
+            if not reservations.reserve(word, progress.owner):
+                reserved_elsewhere += 1
+                continue
+            if previous.get('stage') == 'uploaded':
+                stages['save'].put({'word': word, 'translation': previous['translation'],
+                                    'upload': previous['upload']})
+            elif previous.get('stage') == 'translated':
+                stages['upload'].put({'word': word, 'image_url': previous['image_url'],
+                                      'translation': previous['translation']})
+            else:
+                stages['search'].put({'word': word})
+            fed += 1
+            if args.limit and fed >= args.limit:
+                break
+        if args.limit and fed >= args.limit:
+            break
+
+    stages['search'].close()
+    stop_reporting.set()
+    progress.report()
+    if reserved_elsewhere:
+        print(f"Skipped {reserved_elsewhere} words reserved by reviewers; a rerun picks them up")
+    progress.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+PROVIDER_CACHE_PATH = os.getenv('PROVIDER_CACHE_PATH', 'provider_cache.sqlite3')
+PROVIDER_CACHE_TTL = int(os.getenv('PROVIDER_CACHE_TTL', 7 * 24 * 3600))
+PROVIDER_CACHE_MAX_BYTES = int(os.getenv('PROVIDER_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+
+# Documented free-tier quotas: (requests, per seconds)
+PROVIDER_RATE_LIMITS = {
+    'unsplash': (50, 3600),
+    'pexels': (200, 3600),
+    'pixabay': (100, 60),
+    'brave': (1, 1),
+}
+# How long to sit out after a 429 that carries no reset header
+DEFAULT_COOLDOWN = 60
+
+
+class ResponseCache:
+    """
+    On-disk cache of provider JSON responses keyed by (provider, query,
+    params), with a TTL and least-recently-used eviction once the stored
+    bodies exceed max_bytes.
+    """
+
+    def __init__(self, path=PROVIDER_CACHE_PATH, ttl=PROVIDER_CACHE_TTL, max_bytes=PROVIDER_CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, provider TEXT NOT NULL, body TEXT NOT NULL,"
+                " size INTEGER NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(provider, url, params):
+        canonical = json.dumps([provider, url, sorted((params or {}).items())], default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def get(self, key):
+        conn = self._connect()
+        row = conn.execute("SELECT body, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if time.time() - row[1] > self.ttl:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def set(self, key, provider, data):
+        body = json.dumps(data)
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, provider, body, size, created_at, accessed_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (key, provider, body, len(body), now, now),
+        )
+        self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop the least recently used rows until we are 10% under the cap
+        excess = total - int(self.max_bytes * 0.9)
+        freed = 0
+        keys = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+            keys.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM responses WHERE key = ?", keys)
+
+
+class QuotaLimiter:
+    """
+    Token bucket for one provider, corrected by the provider's own
+    rate-limit headers.
+
+    try_acquire never blocks: when the bucket is empty or the provider has
+    told us the quota is gone, the caller skips the provider instead of
+    waiting for it.
+    """
+
+    def __init__(self, capacity, period):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def available(self):
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            return now >= self.blocked_until and self.tokens >= 1
+
+    def try_acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                return False
+            self._refill(now)
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def update_from_response(self, response):
+        """Sync with X-RateLimit-Remaining / X-RateLimit-Reset and 429s."""
+        remaining = _first_int(response.headers.get('X-Ratelimit-Remaining'))
+        reset = _first_int(response.headers.get('X-Ratelimit-Reset'))
+        with self._lock:
+            now = time.monotonic()
+            if remaining is not None:
+                self.tokens = min(self.tokens, float(remaining))
+            if response.status_code == 429 or remaining == 0:
+                self.tokens = 0.0
+                self.blocked_until = now + _reset_seconds(reset)
+
+
+def _first_int(value):
+    # Brave sends one value per window, e.g. "1, 1999"; the first is the
+    # tightest window
+    if not value:
+        return None
+    try:
+        return int(float(value.split(',')[0].strip()))
+    except ValueError:
+        return None
+
+def _reset_seconds(reset):
+    if reset is None:
+        return DEFAULT_COOLDOWN
+    # Pexels sends a unix timestamp, the others seconds until reset
+    if reset > 10 ** 9:
+        return max(reset - time.time(), 1)
+    return max(reset, 1)
+
+
+response_cache = ResponseCache()
+limiters = {provider: QuotaLimiter(*limit) for provider, limit in PROVIDER_RATE_LIMITS.items()}
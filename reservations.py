@@ -0,0 +1,135 @@
+import os
+import threading
+
+from cache import SQLiteStore, get_store
+from database import supabase_rpc, get_unused_word
+
+# 'rpc' claims through the claim_word function in sql/word_reservations.sql
+# and falls back to 'local' (leases in the shared cache file, see cache.py,
+# so the workers on this host agree) while that function is not deployed
+RESERVATION_BACKEND = os.getenv('RESERVATION_BACKEND', 'rpc')
+# A reservation nobody renews or releases lapses after this long, so a
+# crashed worker or abandoned tab does not hide its word for good
+RESERVATION_SECONDS = int(os.getenv('RESERVATION_SECONDS', 1800))
+
+# How many words the local backend draws before giving up when every draw
+# is already reserved by someone else
+MAX_CLAIM_ATTEMPTS = 5
+
+
+class WordReservations:
+    """
+    Hands each unused word to one reviewer at a time, across workers.
+
+    A reservation belongs to an opaque owner token and lapses after
+    `lease_seconds` unless renewed. Words are matched lowercase, the way
+    mark_word_as_used stores them.
+    """
+
+    namespace = 'word_reservations'
+
+    def __init__(self, backend=RESERVATION_BACKEND, lease_seconds=RESERVATION_SECONDS, store=None):
+        self.lease_seconds = lease_seconds
+        self._use_rpc = backend == 'rpc'
+        # Leases must be shared even when CACHE_BACKEND=local
+        self._store = store or get_store() or SQLiteStore()
+        self._lock = threading.Lock()
+        self.stats = {'claims': 0, 'conflicts': 0, 'renewals': 0, 'lost': 0, 'releases': 0}
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _rpc(self, function, params):
+        """Call a reservation function; None once it turns out to be missing (HTTP 404)."""
+        if not self._use_rpc:
+            return None
+        response = supabase_rpc(function, params)
+        if response.status_code == 404:
+            print(f"{function} is not deployed, using local word leases (see sql/word_reservations.sql)")
+            self._use_rpc = False
+            return None
+        if response.status_code >= 300:
+            raise Exception(f"{function} failed: {response.status_code} {response.text[:200]}")
+        return response
+
+    def claim(self, owner):
+        """
+        Reserve an unused word nobody else holds.
+
+        Args:
+            owner (str): Token identifying the reservation
+
+        Returns:
+            str: The word, or None if no word could be reserved
+        """
+        response = self._rpc('claim_word', {'p_owner': owner, 'p_lease_seconds': self.lease_seconds})
+        if response is not None:
+            word = response.json()
+            if word:
+                self._count('claims')
+            return word
+
+        for _ in range(MAX_CLAIM_ATTEMPTS):
+            word = get_unused_word()
+            if not word:
+                return None
+            if self._store.try_lease(self.namespace, word.lower(), owner, self.lease_seconds):
+                self._count('claims')
+                return word
+            self._count('conflicts')
+        return None
+
+    def _take(self, word, owner):
+        """Take or extend the reservation on a named word; False if someone else holds it."""
+        response = self._rpc('renew_word', {'p_eng_word': word.lower(), 'p_owner': owner,
+                                            'p_lease_seconds': self.lease_seconds})
+        if response is not None:
+            return response.json() is True
+        return self._store.try_lease(self.namespace, word.lower(), owner, self.lease_seconds)
+
+    def reserve(self, word, owner):
+        """
+        Reserve a specific word, e.g. one drawn by pregenerate.py.
+
+        Returns:
+            bool: False if it is reserved by someone else, already used,
+                or the reservation could not be made
+        """
+        try:
+            reserved = self._take(word, owner)
+        except Exception as e:
+            print(f"Could not reserve {word}: {e}")
+            reserved = False
+        self._count('claims' if reserved else 'conflicts')
+        return reserved
+
+    def renew(self, word, owner):
+        """
+        Extend a reservation by another `lease_seconds`.
+
+        Returns:
+            bool: False if the reservation lapsed and someone else holds
+                the word now, or it could not be renewed
+        """
+        try:
+            renewed = self._take(word, owner)
+        except Exception as e:
+            # Treated like a lost lease: the item is dropped and the
+            # reviewer gets another word rather than an error page
+            print(f"Could not renew reservation for {word}: {e}")
+            renewed = False
+        self._count('renewals' if renewed else 'lost')
+        return renewed
+
+    def release(self, word, owner):
+        """Give up a reservation so the word can be drawn again."""
+        try:
+            if self._rpc('release_word', {'p_eng_word': word.lower(), 'p_owner': owner}) is None:
+                self._store.release_lease(self.namespace, word.lower(), owner)
+            self._count('releases')
+        except Exception as e:
+            # The reservation lapses on its own
+            print(f"Could not release reservation for {word}: {e}")
+
+reservations = WordReservations()
@@ -0,0 +1,6 @@
+-- Keys of the resized/re-encoded copies of each accepted image, e.g.
+--   {"200.jpeg": "Elma-<uuid>-200.jpeg", "400.webp": "Elma-<uuid>-400.webp", "800.jpeg": "Elma-<uuid>.jpeg"}
+-- Rows created before this column existed only have s3_key.
+
+alter table "speech-therapy-s3-keys"
+    add column if not exists derivatives jsonb;
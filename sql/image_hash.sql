@@ -0,0 +1,6 @@
+-- Set when an accepted image was a near-duplicate (by perceptual hash) of
+-- one already stored and IMAGE_DUPLICATE_POLICY=flag uploaded it anyway,
+-- or =skip stored a copy of that object under this row's own key.
+
+alter table "speech-therapy-s3-keys"
+    add column if not exists duplicate_of text;
@@ -0,0 +1,51 @@
+-- Atomic scoreboard increments, called through PostgREST as
+--   POST /rest/v1/rpc/increment_score   {"p_username": ..., "p_accepted": 1, "p_rejected": 0}
+--   POST /rest/v1/rpc/increment_scores  {"p_rows": [{"username": ..., "accepted": 3, "rejected": 1}, ...]}
+-- Requires a unique constraint on scoreboard.username. The old
+-- read-then-insert path could create several rows for one user under
+-- concurrent clicks, so those are merged into the oldest row first.
+
+update scoreboard s
+    set accepted = totals.accepted, rejected = totals.rejected
+    from (
+        select username, min(id) as keep_id,
+               sum(coalesce(accepted, 0)) as accepted,
+               sum(coalesce(rejected, 0)) as rejected
+        from scoreboard
+        group by username
+        having count(*) > 1
+    ) totals
+    where s.id = totals.keep_id;
+
+delete from scoreboard a
+    using scoreboard b
+    where a.username = b.username and a.id > b.id;
+
+alter table scoreboard
+    add constraint scoreboard_username_key unique (username);
+
+create or replace function increment_score(p_username text, p_accepted int default 0, p_rejected int default 0)
+returns void
+language sql
+as $$
+    insert into scoreboard (username, accepted, rejected)
+    values (p_username, p_accepted, p_rejected)
+    on conflict (username) do update
+        set accepted = coalesce(scoreboard.accepted, 0) + excluded.accepted,
+            rejected = coalesce(scoreboard.rejected, 0) + excluded.rejected;
+$$;
+
+create or replace function increment_scores(p_rows jsonb)
+returns void
+language sql
+as $$
+    insert into scoreboard (username, accepted, rejected)
+    select r.username, coalesce(r.accepted, 0), coalesce(r.rejected, 0)
+    from jsonb_to_recordset(p_rows) as r(username text, accepted int, rejected int)
+    on conflict (username) do update
+        set accepted = coalesce(scoreboard.accepted, 0) + excluded.accepted,
+            rejected = coalesce(scoreboard.rejected, 0) + excluded.rejected;
+$$;
+
+grant execute on function increment_score(text, int, int) to anon;
+grant execute on function increment_scores(jsonb) to anon;
@@ -0,0 +1,13 @@
+-- Lets `python dataset.py import` upsert batches with
+-- on_conflict=eng_word and resolution=ignore-duplicates. Words are stored
+-- lowercase (see mark_word_as_used). Without this constraint the import
+-- still works, relying only on its own existence check before each insert.
+
+delete from "word-list" a
+    using "word-list" b
+    where lower(a.eng_word) = lower(b.eng_word) and a.id > b.id;
+
+update "word-list" set eng_word = lower(eng_word) where eng_word <> lower(eng_word);
+
+alter table "word-list"
+    add constraint word_list_eng_word_key unique (eng_word);
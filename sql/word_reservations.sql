@@ -0,0 +1,57 @@
+-- Word reservations, called through PostgREST as
+--   POST /rest/v1/rpc/claim_word    {"p_owner": ..., "p_lease_seconds": 1800}  -> "apple" or null
+--   POST /rest/v1/rpc/renew_word    {"p_eng_word": ..., "p_owner": ..., "p_lease_seconds": 1800}  -> true/false
+--   POST /rest/v1/rpc/release_word  {"p_eng_word": ..., "p_owner": ...}
+-- claim_word hands each unused word to one caller: rows being claimed by a
+-- concurrent call are skipped (FOR UPDATE SKIP LOCKED) rather than waited
+-- on, and a reservation whose reserved_until has passed can be claimed
+-- again. Words are matched lowercase, as mark_word_as_used stores them.
+
+alter table "word-list"
+    add column if not exists reserved_by text,
+    add column if not exists reserved_until timestamptz;
+
+create index if not exists word_list_unused_id on "word-list" (id) where is_used = false;
+
+create or replace function claim_word(p_owner text, p_lease_seconds int default 1800)
+returns text
+language sql
+as $$
+    update "word-list"
+    set reserved_by = p_owner,
+        reserved_until = now() + make_interval(secs => p_lease_seconds)
+    where id = (
+        select id from "word-list"
+        where is_used = false
+          and (reserved_until is null or reserved_until < now())
+        order by id
+        limit 1
+        for update skip locked
+    )
+    returning eng_word;
+$$;
+
+create or replace function renew_word(p_eng_word text, p_owner text, p_lease_seconds int default 1800)
+returns boolean
+language sql
+as $$
+    with renewed as (
+        update "word-list"
+        set reserved_by = p_owner,
+            reserved_until = now() + make_interval(secs => p_lease_seconds)
+        where eng_word = p_eng_word
+          and is_used = false
+          and (reserved_by = p_owner or reserved_until is null or reserved_until < now())
+        returning 1
+    )
+    select exists (select 1 from renewed);
+$$;
+
+create or replace function release_word(p_eng_word text, p_owner text)
+returns void
+language sql
+as $$
+    update "word-list"
+    set reserved_by = null, reserved_until = null
+    where eng_word = p_eng_word and reserved_by = p_owner;
+$$;
@@ -0,0 +1,98 @@
+import os
+import threading
+
+from instrumentation import span
+
+AWS_ACCESS_KEY = os.getenv('AWS_ACCESS_KEY')
+AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')
+AWS_REGION = os.getenv('AWS_REGION', 'eu-north-1')
+S3_BUCKET = os.getenv('S3_BUCKET', 'therapy-app-s3')
+# S3-compatible store to use instead of AWS, e.g. MinIO or the benchmark
+# stand-ins; addressed path-style
+S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL')
+
+S3_MAX_POOL_CONNECTIONS = int(os.getenv('S3_MAX_POOL_CONNECTIONS', 32))
+S3_UPLOAD_CONCURRENCY = int(os.getenv('S3_UPLOAD_CONCURRENCY', 10))
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_s3_client(region=AWS_REGION):
+    """
+    Return the shared S3 client for a region, creating it on first use.
+
+    boto3 clients are thread-safe once built; building them is not, and
+    costs tens of milliseconds, so every caller shares one per region.
+    """
+    client = _clients.get(region)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(region)
+            if client is None:
+                # Imported here: boto3 costs noticeable startup time
+                import boto3
+                from botocore.config import Config
+                session = boto3.session.Session(
+                    aws_access_key_id=AWS_ACCESS_KEY,
+                    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+                    region_name=region
+                )
+                client = _clients[region] = session.client('s3', endpoint_url=S3_ENDPOINT_URL, config=Config(
+                    max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+                    retries={'max_attempts': 5, 'mode': 'adaptive'},
+                    tcp_keepalive=True,
+                    s3={'addressing_style': 'path'} if S3_ENDPOINT_URL else None
+                ))
+    return client
+
+def put_object(key, body, content_type='image/jpeg', bucket=S3_BUCKET):
+    """Upload a single object with the shared client."""
+    with span('s3.put'):
+        get_s3_client().put_object(Bucket=bucket, Key=key, Body=body, ContentType=content_type)
+    return key
+
+def copy_object(source_key, key, bucket=S3_BUCKET):
+    """Copy an object within the bucket without downloading it."""
+    with span('s3.copy'):
+        get_s3_client().copy_object(Bucket=bucket, Key=key, CopySource={'Bucket': bucket, 'Key': source_key})
+    return key
+
+def get_object(key, bucket=S3_BUCKET):
+    """Download a single object with the shared client.
+
+    Returns:
+        bytes: The object body
+    """
+    with span('s3.get'):
+        return get_s3_client().get_object(Bucket=bucket, Key=key)['Body'].read()
+
+def upload_many(objects, bucket=S3_BUCKET, concurrency=S3_UPLOAD_CONCURRENCY):
+    """
+    Upload many objects in parallel through one transfer manager.
+
+    Large bodies are split into multipart uploads automatically.
+
+    Args:
+        objects (iterable): (key, fileobj, content_type) tuples
+        bucket (str): Target bucket
+        concurrency (int): Parallel requests
+
+    Returns:
+        tuple: (uploaded keys, {key: exception} for failures)
+    """
+    from boto3.s3.transfer import TransferConfig, create_transfer_manager
+    config = TransferConfig(max_concurrency=concurrency, use_threads=True)
+    uploaded, failed = [], {}
+    with span('s3.upload_many'), create_transfer_manager(get_s3_client(), config) as manager:
+        futures = [
+            (key, manager.upload(fileobj, bucket, key, extra_args={'ContentType': content_type}))
+            for key, fileobj, content_type in objects
+        ]
+        for key, future in futures:
+            try:
+                future.result()
+                uploaded.append(key)
+            except Exception as e:
+                failed[key] = e
+    return uploaded, failed
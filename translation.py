@@ -1,44 +1,112 @@
-from google.cloud import translate_v2 as translate_client
 import os
+import threading
 from dotenv import load_dotenv
 
+from cache import Cache
+from instrumentation import span
+
 # Load environment variables from .env file
 load_dotenv()
 
-# Set the path to the Google Cloud service account JSON file
-os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = 'google_stt.json'
+TRANSLATION_LRU_SIZE = int(os.getenv('TRANSLATION_LRU_SIZE', 4096))
+# Google Translate v2 accepts at most 128 segments per request
+TRANSLATE_BATCH_SIZE = 128
 
-def translate_text(text, source="en", target="tr"):
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
     """
-    Translates text using Google Cloud Translation API.
+    Return the shared Translation client, creating it on first use.
     
+    google-cloud-translate pulls in grpc and protobuf, so it is imported
+    here rather than at module level to keep app startup fast.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from google.cloud import translate_v2 as translate_client
+                # Set the path to the Google Cloud service account JSON file
+                os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = 'google_stt.json'
+                _client = translate_client.Client()
+    return _client
+
+
+class TranslationCache:
+    """
+    Translation cache keyed by (source, target, text), stored in the shared
+    cache so every worker on the host reuses what any worker translated.
+    Entries do not expire; the shared tier keeps the newest
+    CACHE_SHARED_MAXSIZE of them.
+    """
+
+    def __init__(self, lru_size=TRANSLATION_LRU_SIZE):
+        self._cache = Cache('translations', maxsize=lru_size)
+
+    @staticmethod
+    def _key(text, source, target):
+        return f"{source}:{target}:{text}"
+
+    def get_many(self, texts, source, target):
+        """Return {text: translation} for the texts that are cached."""
+        keys = {self._key(text, source, target): text for text in texts}
+        return {keys[key]: translated for key, translated in self._cache.get_many(keys).items()}
+
+    def put_many(self, pairs, source, target):
+        """Store an iterable of (text, translation) pairs."""
+        self._cache.set_many((self._key(text, source, target), translated) for text, translated in pairs)
+
+translation_cache = TranslationCache()
+
+
+def translate_batch(texts, source="en", target="tr"):
+    """
+    Translates many texts, using the cache and one API call per 128 misses.
+
     Args:
-        text (str): The text to translate
+        texts (list): The texts to translate
         source (str): Source language code (e.g., 'en' for English)
         target (str): Target language code (e.g., 'tr' for Turkish)
-    
+
     Returns:
-        str: The translated text
+        list: Translations in the same order as `texts`
     """
+    texts = list(texts)
+    found = translation_cache.get_many(set(texts), source, target)
+    missing = list(dict.fromkeys(text for text in texts if text not in found))
+
     try:
-        # Initialize the Translation client
-        client = translate_client.Client()
-        
-        # Perform the translation
-        result = client.translate(
-            text,
-            source_language=source,
-            target_language=target
-        )
-        
-        # Debug: print the response to understand the structure
-        print(f"Google Cloud Translation API response: {result}")
-        
-        return result['translatedText']
-        
+        for i in range(0, len(missing), TRANSLATE_BATCH_SIZE):
+            chunk = missing[i:i + TRANSLATE_BATCH_SIZE]
+            with span('google_translate'):
+                results = get_client().translate(
+                    chunk,
+                    source_language=source,
+                    target_language=target
+                )
+            translated = [(text, result['translatedText']) for text, result in zip(chunk, results)]
+            translation_cache.put_many(translated, source, target)
+            found.update(translated)
     except Exception as e:
         raise Exception(f"Translation failed: {e}")
 
+    return [found[text] for text in texts]
+
+def translate_text(text, source="en", target="tr"):
+    """
+    Translates text using Google Cloud Translation API.
+
+    Args:
+        text (str): The text to translate
+        source (str): Source language code (e.g., 'en' for English)
+        target (str): Target language code (e.g., 'tr' for Turkish)
+
+    Returns:
+        str: The translated text
+    """
+    return translate_batch([text], source, target)[0]
+
 # Keep the old function name for backward compatibility
 def translate(text, source="EN", target="TR"):
     """
@@ -46,3 +114,25 @@ def translate(text, source="EN", target="TR"):
     Converts language codes to lowercase and calls translate_text.
     """
     return translate_text(text, source.lower(), target.lower())
+
+def pretranslate_word_list(source="en", target="tr"):
+    """
+    Fill the translation cache for every word in word-list, so page views
+    never wait on Google. Words are title-cased the same way `home()` does
+    before translating.
+
+    Returns:
+        int: Number of words processed
+    """
+    from database import iter_word_list
+
+    total = 0
+    for rows in iter_word_list():
+        words = [row['eng_word'].title() for row in rows]
+        translate_batch(words, source, target)
+        total += len(words)
+        print(f"Pre-translated {total} words")
+    return total
+
+if __name__ == '__main__':
+    pretranslate_word_list()